@@ -1,24 +1,128 @@
-import streamlit as st
-import pandas as pd
-import google.generativeai as genai
-import matplotlib.pyplot as plt
+import time
+_SCRIPT_STARTED_AT = time.perf_counter() # 시작 프로파일용 (스크립트 실행 시작 시각)
+import sys
+_PRELOADED_MODULES = set(sys.modules) # 스크립트 실행 전에 (Streamlit 서버 등이) 이미 불러온 모듈
 import warnings
 import re
 import json
-import time
+import os
+import math
+import hashlib
+import tempfile
+from datetime import datetime
 import io
 import base64
-import streamlit.components.v1 as components
+import threading
+import importlib
+_STDLIB_IMPORT_SEC = time.perf_counter() - _SCRIPT_STARTED_AT
+# [추가] 외부 라이브러리는 시작 프로파일에 모듈별로 기록하기 위해 하나씩 시간을 잽니다.
+_TOP_IMPORT_TIMES = {}
+_t = time.perf_counter()
+import streamlit as st
+_TOP_IMPORT_TIMES["streamlit"] = time.perf_counter() - _t
+_t = time.perf_counter()
+import pandas as pd # 홈 화면의 가게 목록(load_data)에 필요하므로 지연 로딩하지 않습니다.
+_TOP_IMPORT_TIMES["pandas"] = time.perf_counter() - _t
+_t = time.perf_counter()
+import numpy as np
+_TOP_IMPORT_TIMES["numpy"] = time.perf_counter() - _t
+# [수정] google.generativeai, matplotlib 은 홈 화면에 필요 없으므로 get_genai()/get_pyplot() 에서 처음 쓸 때 불러옵니다.
+_TOP_IMPORT_SEC = time.perf_counter() - _SCRIPT_STARTED_AT
 
 # 경고 메시지 무시
 warnings.filterwarnings('ignore')
 
 # ----------------------------------------------------------------------
-# 한글 폰트 설정 (Streamlit Cloud 호환)
+# 0. 무거운 라이브러리 지연 로딩 및 시작 프로파일
 # ----------------------------------------------------------------------
-plt.rcParams['font.family'] = 'NanumGothic'
-plt.rcParams['axes.unicode_minus'] = False
+# 시작 프로파일 출력 여부 (환경변수 STARTUP_PROFILE=1 이면 첫 홈 화면 렌더 후 JSON 한 줄을 stdout 과 파일로 남김)
+STARTUP_PROFILE_ENABLED = os.environ.get("STARTUP_PROFILE", "0") == "1"
+STARTUP_PROFILE_PATH = "startup_profile.json"
+# 서버/백그라운드 스레드에서 안전한 비-GUI 백엔드 (matplotlib 을 불러오기 전에 지정)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+@st.cache_resource
+def get_startup_profile():
+    """프로세스당 하나인 시작 프로파일 딕셔너리 (재실행(rerun)마다 초기화되지 않도록 캐시)"""
+    return {"imports": {}, "first_homepage_render_sec": None}
+
+def _timed_import(module_name, source):
+    """
+    모듈을 불러오고, 처음 불러온 경우에만 걸린 시간을 시작 프로파일에 기록합니다.
+    다른 스레드가 불러오는 중이면 import_module 이 완료될 때까지 기다려 줍니다.
+    """
+    first_load = module_name not in sys.modules
+    started_at = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if first_load:
+        get_startup_profile()["imports"].setdefault(module_name, {"sec": round(time.perf_counter() - started_at, 3), "source": source})
+    return module
 
+def get_genai(source="on-demand"):
+    """google.generativeai 는 AI 리포트(tab3)를 처음 생성할 때 불러옵니다."""
+    return _timed_import("google.generativeai", source)
+
+def get_pyplot(source="on-demand"):
+    """matplotlib 은 차트(tab2)를 처음 그릴 때 불러오고, 이때 한글 폰트를 설정합니다."""
+    _timed_import("matplotlib", source)
+    plt = _timed_import("matplotlib.pyplot", source)
+    # ----------------------------------------------------------------------
+    # 한글 폰트 설정 (Streamlit Cloud 호환)
+    # ----------------------------------------------------------------------
+    plt.rcParams['font.family'] = 'NanumGothic'
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
+
+@st.cache_resource
+def start_background_warmup():
+    """첫 화면을 그린 뒤 백그라운드 스레드에서 무거운 라이브러리를 미리 불러옵니다. (프로세스당 1회)"""
+    def warmup():
+        started_at = time.perf_counter()
+        get_pyplot(source="background")
+        get_genai(source="background")
+        get_startup_profile()["background_warmup_sec"] = round(time.perf_counter() - started_at, 3)
+        _emit_startup_profile("import_warmup")
+    thread = threading.Thread(target=warmup, name="import-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _process_uptime():
+    """프로세스 시작부터 지금까지의 시간(초). /proc 를 읽을 수 없는 환경에서는 None"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            system_uptime = float(f.read().split()[0])
+        return round(system_uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def record_first_homepage_render():
+    """프로세스의 첫 홈 화면 렌더 시간을 기록하고, STARTUP_PROFILE=1 이면 결과를 출력합니다."""
+    profile = get_startup_profile()
+    if profile["first_homepage_render_sec"] is not None:
+        return
+    profile["first_homepage_render_sec"] = round(time.perf_counter() - _SCRIPT_STARTED_AT, 3)
+    profile["script_top_imports_sec"] = round(_TOP_IMPORT_SEC, 3)
+    profile["top_imports"] = {
+        "stdlib": {"sec": round(_STDLIB_IMPORT_SEC, 3)},
+        **{name: {"sec": round(sec, 3), "preloaded": name in _PRELOADED_MODULES} for name, sec in _TOP_IMPORT_TIMES.items()},
+    }
+    profile["process_uptime_sec"] = _process_uptime()
+    profile["deferred_loaded_before_render"] = [m for m in ("google.generativeai", "matplotlib.pyplot") if m in sys.modules]
+    _emit_startup_profile("first_homepage_render")
+
+def _emit_startup_profile(event):
+    """STARTUP_PROFILE=1 이면 현재 시작 프로파일을 stdout(JSON 한 줄)과 STARTUP_PROFILE_PATH 파일로 남깁니다."""
+    if not STARTUP_PROFILE_ENABLED:
+        return
+    profile = get_startup_profile()
+    print(json.dumps({"event": event, **profile}, ensure_ascii=False), flush=True)
+    try:
+        with open(STARTUP_PROFILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, indent=2)
+    except OSError:
+        pass
 
 # ----------------------------------------------------------------------
 # 1. 페이지 기본 설정
@@ -38,6 +142,7 @@ def load_data(filepath):
     """데이터를 로드하고, 표시용 리스트와 매핑용 딕셔너리를 반환합니다."""
     try:
         df = pd.read_csv(filepath, encoding='cp949')
+        df = add_normalized_address_columns(df) # [추가] 주소 정규화 (도로명/건물번호/도로축 위치)
         # 중복 제거 및 가나다 순 정렬
         unique_stores = sorted(df['가맹점명'].dropna().unique())
         
@@ -59,6 +164,195 @@ def load_data(filepath):
         st.error(f"데이터 로드 중 오류 발생: {e}")
         return None, None, None
 
+# ----------------------------------------------------------------------
+# 2-1. 주소 정규화 및 도로축 격자 인덱스 (온라인 지오코더 없이 동작)
+# ----------------------------------------------------------------------
+# 시도 약칭 -> 정식 명칭
+SIDO_ALIASES = {
+    "서울": "서울특별시", "부산": "부산광역시", "대구": "대구광역시", "인천": "인천광역시",
+    "광주": "광주광역시", "대전": "대전광역시", "울산": "울산광역시", "세종": "세종특별자치시",
+    "경기": "경기도", "강원": "강원특별자치도", "충북": "충청북도", "충남": "충청남도",
+    "전북": "전북특별자치도", "전남": "전라남도", "경북": "경상북도", "경남": "경상남도", "제주": "제주특별자치도",
+}
+ROAD_ADDRESS_PATTERN = r"(?:^|\s)(?P<도로명>[가-힣A-Za-z0-9]+(?:로|길))\s*(?P<건물본번>\d+)(?:-(?P<건물부번>\d+))?"
+# 'OO로14길', '연무장5가길' 처럼 큰 도로에서 갈라진 길 (가/나/다.. 는 같은 번호 사이에 끼어든 길)
+BRANCH_ROAD_PATTERN = r"^(?P<기준도로>.+?)(?P<분기번호>\d+)(?P<분기접미>[가-힣])?길$"
+
+# 도로명주소의 건물번호와 'N길' 번호는 모두 시작점부터의 기초구간(약 10m) 번호이므로,
+# (기준 도로, 번호 // 셀 크기)를 도로축 격자 셀로 사용합니다. 셀 크기 10 ≈ 약 100m
+ROAD_GRID_CELL_SIZE = 10
+NEARBY_CELL_RADIUS = 1
+
+def add_normalized_address_columns(df):
+    """'주소' 컬럼을 파싱해 정규화주소/도로명/건물번호/기준도로/도로축셀 컬럼을 추가합니다."""
+    address = df['주소'].fillna("").astype(str).str.split().str.join(" ")
+    tokens = address.str.split(" ", n=2)
+    sido = tokens.str[0].map(lambda x: SIDO_ALIASES.get(x, x))
+
+    road = address.str.extract(ROAD_ADDRESS_PATTERN)
+    branch = road['도로명'].str.extract(BRANCH_ROAD_PATTERN)
+    base_road = branch['기준도로'].where(branch['기준도로'].str.contains(r"(?:로|길)$", na=False), branch['기준도로'] + "길")
+
+    main_no = pd.to_numeric(road['건물본번'], errors='coerce')
+    branch_no = pd.to_numeric(branch['분기번호'], errors='coerce')
+    # '가/나/다..' 길은 같은 번호 길 바로 다음에 위치 (가=0.1, 나=0.2, ...)
+    branch_offset = branch['분기접미'].map(lambda c: ("가나다라마바사아자차카타파하".find(c) + 1) * 0.1 if isinstance(c, str) else 0.0)
+
+    df = df.copy()
+    df['도로명'] = road['도로명']
+    df['건물번호'] = road['건물본번'].where(road['건물부번'].isna(), road['건물본번'] + "-" + road['건물부번'])
+    df['정규화주소'] = (sido + " " + tokens.str[1] + " " + df['도로명'] + " " + df['건물번호']).where(df['도로명'].notna())
+    df['기준도로'] = base_road.fillna(road['도로명'])
+    axis_position = branch_no.add(branch_offset).fillna(main_no)
+    df['도로축셀'] = (axis_position // ROAD_GRID_CELL_SIZE).astype('Int64')
+    return df
+
+@st.cache_resource
+def build_competitor_index(_data, filepath):
+    """
+    (업종, 도로명) / (업종, 기준도로, 도로축셀) -> 행 인덱스 목록 딕셔너리를 만듭니다.
+    데이터 파일(filepath)별로 한 번만 만들어 모든 세션에서 재사용합니다.
+    """
+    road_index, grid_index = {}, {}
+    indexed = _data.dropna(subset=['업종', '도로명'])
+    for idx, industry, road, base_road, cell in zip(indexed.index, indexed['업종'], indexed['도로명'], indexed['기준도로'], indexed['도로축셀']):
+        road_index.setdefault((industry, road), []).append(idx)
+        if not pd.isna(cell):
+            grid_index.setdefault((industry, base_road, int(cell)), []).append(idx)
+    return {"road": road_index, "grid": grid_index}
+
+def find_nearby_competitors(index, store_data, n_cells=NEARBY_CELL_RADIUS):
+    """
+    같은 업종 가게 중 '같은 도로'와 '같은 기준 도로의 ±n_cells 셀 이내'에 있는 가게의 행 인덱스를 반환합니다.
+    도로명 주소가 없으면 None 을 반환합니다.
+    """
+    industry, road = store_data.get('업종'), store_data.get('도로명')
+    if pd.isna(industry) or pd.isna(road):
+        return None
+    same_road = [i for i in index["road"].get((industry, road), []) if i != store_data.name]
+
+    nearby = []
+    cell = store_data.get('도로축셀')
+    if not pd.isna(cell):
+        for c in range(int(cell) - n_cells, int(cell) + n_cells + 1):
+            nearby.extend(i for i in index["grid"].get((industry, store_data.get('기준도로'), c), []) if i != store_data.name)
+    return {"same_road": same_road, "nearby": nearby}
+
+def summarize_nearby_competitors(data, competitors, n_cells=NEARBY_CELL_RADIUS):
+    """주변 동종 업종 경쟁 현황을 프롬프트용 한 줄 텍스트로 요약합니다."""
+    if competitors is None:
+        return "도로명 주소 없음"
+    parts = []
+    for key, label in [("same_road", "같은 도로"), ("nearby", f"인근(도로축 ±{n_cells}칸, 칸당 약 {ROAD_GRID_CELL_SIZE * 10}m)")]:
+        rows = data.loc[competitors[key]]
+        parts.append(f"{label} {len(rows)}개 (운영 중 {int(rows['폐업일'].isna().sum())}개)")
+    return ", ".join(parts)
+
+# ----------------------------------------------------------------------
+# 2-2. 상권 × 업종 백분위 큐브 (동종 비교용)
+# ----------------------------------------------------------------------
+PEER_QUANTILES = [0.10, 0.25, 0.50, 0.75, 0.90]
+PEER_MIN_COUNT = 5 # 비교 집단 최소 가게 수 (미만이면 상권 전체 -> 업종 전체 순으로 대체)
+# 값이 낮을수록 좋은 지표 (순위 비율은 '상위 N%' 값, 폐업 비율은 낮을수록 안전,
+# 매출 구간은 1구간=상위 10% ~ 6구간=하위 10%)
+LOWER_IS_BETTER_METRICS = {"상권내매출순위비율", "업종내매출순위비율", "상권내폐업비율", "업종내폐업비율", "매출건수구간", "매출금액구간"}
+
+def _file_fingerprint(filepath):
+    """데이터 파일 내용의 해시값 (스냅샷이 바뀌면 큐브를 다시 만들기 위함)"""
+    with open(filepath, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def build_percentile_cube(data):
+    """
+    월별 지표(_1m/_2m/_3m) 전체에 대해 (상권, 업종) / (상권, 전체) / (전체, 업종) 별 분위수와 가게 수를 계산합니다.
+    각 집계 단위마다 groupby 한 번으로 모든 지표·분위수를 함께 계산합니다.
+    """
+    metric_cols = [col for col in data.columns if re.search(r"_\dm$", col)]
+    frames = []
+    for keys in [['상권', '업종'], ['상권'], ['업종']]:
+        grouped = data.groupby(keys)[metric_cols]
+        quantiles = grouped.quantile(PEER_QUANTILES).unstack(level=-1) # 행: 그룹, 열: (지표, 분위수)
+        counts = grouped.count()
+        quantiles.columns.names = ['지표', '분위수']
+        counts.columns.name = '지표'
+        cube = quantiles.stack(level='지표', future_stack=True) # 행: (그룹, 지표), 열: 분위수
+        cube.columns = [f"p{int(q * 100)}" for q in cube.columns]
+        cube['n'] = counts.stack(future_stack=True).reindex(cube.index).values
+        cube = cube.reset_index()
+        for key in ['상권', '업종']:
+            if key not in keys:
+                cube[key] = None
+        frames.append(cube)
+    return pd.concat(frames, ignore_index=True)[['상권', '업종', '지표'] + [f"p{int(q * 100)}" for q in PEER_QUANTILES] + ['n']]
+
+@st.cache_resource
+def load_percentile_cube(_data, filepath):
+    """
+    백분위 큐브를 데이터 파일 옆({filepath}.peer_cube.pkl)에 함께 저장하고, 파일 내용이 같으면 다시 계산하지 않고 불러옵니다.
+    조회용 {(상권, 업종): {지표: (분위수 배열, 가게 수)}} 딕셔너리를 반환합니다.
+    """
+    cube_path = f"{filepath}.peer_cube.pkl"
+    fingerprint = _file_fingerprint(filepath)
+    cube = None
+    if os.path.exists(cube_path):
+        try:
+            saved = pd.read_pickle(cube_path)
+            if saved.get("fingerprint") == fingerprint:
+                cube = saved["cube"]
+        except Exception:
+            cube = None
+    if cube is None:
+        cube = build_percentile_cube(_data)
+        try:
+            pd.to_pickle({"fingerprint": fingerprint, "cube": cube}, cube_path)
+        except OSError:
+            pass # 읽기 전용 배포 환경에서는 메모리 캐시만 사용
+
+    lookup = {}
+    q_cols = [f"p{int(q * 100)}" for q in PEER_QUANTILES]
+    for district, industry, metric, n, qs in zip(cube['상권'], cube['업종'], cube['지표'], cube['n'], cube[q_cols].to_numpy()):
+        if n > 0:
+            key = (None if pd.isna(district) else district, None if pd.isna(industry) else industry)
+            lookup.setdefault(key, {})[metric] = (qs, int(n))
+    return lookup
+
+def peer_rank(cube, store_data, metric_col):
+    """
+    가게의 지표 값이 비교 집단에서 '상위 몇 %'인지 분위수 보간으로 계산합니다.
+    (상위 N%, 비교 집단 이름, 가게 수)를 반환하며, 계산할 수 없으면 None 을 반환합니다.
+    """
+    value = store_data.get(metric_col)
+    if pd.isna(value):
+        return None
+    district, industry = store_data.get('상권'), store_data.get('업종')
+    district_known = has_district(district) # '상권없음' 등은 NO_DISTRICT_VALUES 로 한 곳에서 판단
+    industry_known = not pd.isna(industry)
+    candidates = []
+    if district_known and industry_known:
+        candidates.append(((district, industry), f"{district}·{industry}"))
+    if district_known:
+        candidates.append(((district, None), f"{district} 상권"))
+    if industry_known:
+        candidates.append(((None, industry), f"{industry} 업종"))
+
+    for key, label in candidates:
+        entry = cube.get(key, {}).get(metric_col)
+        if entry is not None and entry[1] >= PEER_MIN_COUNT:
+            break
+    else:
+        return None
+
+    quantiles, n = entry
+    levels = np.array(PEER_QUANTILES) * 100
+    left, right = np.searchsorted(quantiles, value, side="left"), np.searchsorted(quantiles, value, side="right")
+    if left != right:
+        percentile = levels[left:right].mean() # 분위수 값이 겹치는(동점) 경우 가운데 값
+    else:
+        percentile = np.interp(value, quantiles, levels, left=levels[0] / 2, right=(100 + levels[-1]) / 2)
+
+    top = percentile if metric_col.rsplit('_', 1)[0] in LOWER_IS_BETTER_METRICS else 100 - percentile
+    return max(1, int(round(top))), label, n
+
 # ----------------------------------------------------------------------
 # 3. 맞춤형 설명 분석(Parsing) 및 프롬프트 생성 함수
 # ----------------------------------------------------------------------
@@ -92,7 +386,11 @@ def generate_prompt(store_name, industry, open_date, close_date,
                     customer_type, competitiveness, customer_relation,
                     local_district_name, local_industry_info, # 👈 [수정] local_area_info -> 두 개로 분리
                     trend_analysis_text):
-    """AI에게 JSON 형식으로 구조화된 답변을 요청하는 프롬프트를 생성합니다."""
+    """AI에게 JSON 형식으로 구조화된 답변을 요청하는 프롬프트를 생성합니다.
+
+    [참고] 지침까지 모두 포함한 기존(비압축) 프롬프트입니다. 현재는 절감량 비교 기준으로만 사용하며,
+    실제 호출에는 build_compact_prompt + SYSTEM_INSTRUCTION 조합을 사용합니다.
+    """
     close_info = "현재 운영 중" if pd.isna(close_date) else f"폐업일: {close_date}"
     prompt = f"""
 당신은 대한민국 소상공인을 위한 최고의 AI 전략 컨설턴트입니다.
@@ -145,6 +443,519 @@ def generate_prompt(store_name, industry, open_date, close_date,
 """
     return prompt.strip()
 
+# ----------------------------------------------------------------------
+# 3-1. 토큰 예산 기반 압축 프롬프트
+# ----------------------------------------------------------------------
+# 호출 1회의 입력 토큰 예산 (환경변수 PROMPT_TOKEN_BUDGET 로 조정)
+# system_instruction 도 매 호출마다 입력 토큰으로 과금되므로, 시스템 지침 + 가게별 프롬프트 합계 기준입니다.
+# 시스템 지침(약 630토큰)을 빼면 가게별 몫은 약 270토큰으로, 실제 가게 프롬프트(약 220~290토큰)의 절반 정도가 압축 단계를 거칩니다.
+# 압축 단계를 모두 거쳐도 넘으면 프롬프트 끝에서부터 줄을 잘라 맞추고, 가맹점 기본 정보만으로도 넘으면 ValueError 를 냅니다.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "900"))
+# 프롬프트 첫 줄부터 이 줄 수까지([가맹점 기본 정보])는 예산 초과 시에도 자르지 않습니다.
+PROMPT_KEEP_LINES = 2
+
+# 모든 가게에 공통인 고정 지침. 매 호출마다 프롬프트에 붙이지 않고 모델의 system_instruction 으로 한 번만 등록합니다.
+SYSTEM_INSTRUCTION = """
+당신은 대한민국 소상공인을 위한 최고의 AI 전략 컨설턴트입니다.
+사용자가 제공하는 [가맹점 기본 정보], [AI 정밀 진단 요약], [주요 지표 3개월 추세]를 종합적으로 분석하여
+해당 가게 사장님을 위한 맞춤형 전략 리포트를 JSON 형식으로 작성해주세요.
+
+[리포트 작성 가이드라인 (JSON 형식)]
+1. 반드시 지정된 JSON 스키마의 항목으로만 답변해주세요. JSON 외에 다른 텍스트를 포함하지 마세요.
+2. 'store_summary': 사장님 가게 유형을 한 문장으로 정의해주세요.
+3. 'risk_signal', 'opportunity_signal': 가장 중요한 위험/기회 신호 1가지씩을 넣어주세요.
+4. 'action_plan_title'('핵심 액션 플랜: [제목]' 형식), 'action_plan_detail': 구체적인 액션 플랜 1가지를 제안해주세요.
+5. 'fact_based_example': 위 'action_plan'과 유사한 전략으로 성공한 (사실 기반의) 타 업종 사례를 1~2줄로 요약해주세요.
+6. 'example_source': 위 성공 사례의 신뢰도를 위해, 관련 뉴스 기사 등의 출처 URL을 포함해주세요.
+   - [중요] 만약 확실하고 유효한 URL을 모른다면, 절대 URL을 지어내지 말고 "출처 없음"으로 응답해주세요.
+7. 'action_table': [단계, 실행 방안, 예상 비용]을 포함하는 마크다운 테이블 텍스트를 생성해주세요. (예: | 단계 | 실행 방안 | 예상 비용 |)
+8. 'expected_effect': 예상 기대효과를 구체적인 수치로 제시해주세요.
+9. 'encouragement': 사장님을 위한 따뜻한 응원의 메시지를 넣어주세요.
+10. 'local_event_recommendation' (title, details, source):
+    - [상권 이름]의 특징 (예: 20대 유동인구가 많음, 오피스 상권임 등)을 당신의 **사전 학습된 지식**을 바탕으로 추론해주세요.
+    - 그 특징과 사장님 가게의 업종을 연계할 수 있는 **마케팅 아이디어** 1개를 제안해주세요.
+    - [중요] **절대 실시간 웹 검색을 시도하거나 '오늘' 날짜의 이벤트를 찾으려고 하지 마세요.** 당신의 지식 기반으로 한 "아이디어"를 제안하는 것입니다.
+    - URL은 제안한 아이디어와 관련된 **일반적인 정보성 블로그/기사 URL 1개**를 추천해줄 수 있습니다.
+    - 확실한 URL이 없다면 "출처 없음"으로 응답하고, 절대 URL을 지어내지 마세요.
+    - [상권 브리프]가 주어지면 이 항목은 작성하지 않습니다. 상권 특징을 다시 추론하지 말고 브리프 내용을 전제로 나머지 항목을 작성해주세요.
+11. [주요 지표 3개월 추세]에서 한 줄로 묶인 지표는 1·2개월 전 대비 모두 '유지'인 지표입니다.
+""".strip()
+
+def estimate_tokens(text):
+    """API 호출 없이 토큰 수를 대략 추정합니다. (ASCII 약 4자당 1토큰, 한글 등은 약 1.5자당 1토큰)"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5)
+
+def get_store_trends(store_data):
+    """가게 데이터에서 '추세' 컬럼만 뽑아 {지표명: 추세 문자열 또는 None} 딕셔너리로 반환합니다."""
+    trends = {}
+    for col in store_data.index:
+        if '추세' in col:
+            val = store_data.get(col)
+            trends[col.replace('_추세', '')] = None if pd.isna(val) else str(val)
+    return trends
+
+def full_trend_text(trends):
+    """기존 방식대로 '추세' 컬럼마다 한 줄씩 나열한 텍스트를 만듭니다."""
+    return "\n".join([f"- {name} 추세: {val if val is not None else '데이터 없음'}" for name, val in trends.items()])
+
+def compact_trend_text(trends, list_unchanged=True, max_changed=None):
+    """변화가 있는 지표만 한 줄씩 쓰고, '유지 유지'/데이터 없음 지표는 각각 한 줄로 합칩니다."""
+    changed, unchanged, missing = [], [], []
+    for name, val in trends.items():
+        if val is None:
+            missing.append(name)
+        elif all(part == "유지" for part in val.split()):
+            unchanged.append(name)
+        else:
+            changed.append(f"- {name}: {val}")
+
+    if max_changed is not None and len(changed) > max_changed:
+        changed = changed[:max_changed] + [f"- 그 외 {len(changed) - max_changed}개 지표 변동 (생략)"]
+
+    lines = list(changed)
+    if unchanged:
+        names = f": {', '.join(unchanged)}" if list_unchanged else ""
+        lines.append(f"- 변화 없음(유지 유지) {len(unchanged)}개{names}")
+    if missing:
+        lines.append(f"- 데이터 없음 {len(missing)}개")
+    return "\n".join(lines) if lines else "- 추세 데이터 없음"
+
+def build_legacy_prompt(store_name, industry, open_date, close_date,
+                        closure_risk, closure_factors,
+                        customer_type, competitiveness, customer_relation,
+                        local_district_name, local_industry_info,
+                        trends, nearby_competition_info="데이터 없음"):
+    """build_compact_prompt 와 같은 인자로 기존(비압축) 프롬프트를 만듭니다. (토큰/지연시간 비교 기준)"""
+    return generate_prompt(
+        store_name=store_name, industry=industry, open_date=open_date, close_date=close_date,
+        closure_risk=closure_risk, closure_factors=closure_factors,
+        customer_type=customer_type, competitiveness=competitiveness, customer_relation=customer_relation,
+        local_district_name=local_district_name, local_industry_info=f"{local_industry_info}, 인근 동종 업종: {nearby_competition_info}",
+        trend_analysis_text=full_trend_text(trends)
+    )
+
+def build_compact_prompt(store_name, industry, open_date, close_date,
+                         closure_risk, closure_factors,
+                         customer_type, competitiveness, customer_relation,
+                         local_district_name, local_industry_info,
+                         trends, nearby_competition_info="데이터 없음", token_budget=PROMPT_TOKEN_BUDGET,
+                         district_brief=None):
+    """
+    고정 지침(SYSTEM_INSTRUCTION)을 뺀 가게별 데이터만으로 프롬프트를 만들고,
+    시스템 지침과 합한 입력 토큰이 예산을 넘으면 단계적으로 줄입니다. 압축 단계를 모두 거쳐도 넘으면 끝에서부터 줄을 잘라내며(truncated_lines), 그래도 넘으면 ValueError 를 냅니다.
+    district_brief(상권 × 업종 브리프)가 있으면 상권 내 주요 업종 대신 브리프 요약을 넣습니다.
+    (프롬프트, 토큰 통계 딕셔너리)를 반환합니다.
+    """
+    close_info = "현재 운영 중" if pd.isna(close_date) else f"폐업일: {close_date}"
+    industry_items = [item.strip() for item in str(local_industry_info).split(",")]
+    system_tokens = estimate_tokens(SYSTEM_INSTRUCTION)
+    store_budget = token_budget - system_tokens # 가게별 프롬프트에 쓸 수 있는 몫
+
+    # 압축 단계: 뒤로 갈수록 더 많이 생략합니다. (지표 이름 목록 → 상권 업종 Top3 → 변동 지표 상위 5개)
+    levels = [
+        dict(list_unchanged=True, max_changed=None, top_industries=5),
+        dict(list_unchanged=False, max_changed=None, top_industries=5),
+        dict(list_unchanged=False, max_changed=None, top_industries=3),
+        dict(list_unchanged=False, max_changed=5, top_industries=3),
+    ]
+    for level, opts in enumerate(levels):
+        trend_text = compact_trend_text(trends, opts["list_unchanged"], opts["max_changed"])
+        if district_brief is not None:
+            district_text = f"- 상권 브리프: {district_brief_summary(district_brief)}"
+        else:
+            district_text = f"- 상권 내 주요 업종: {', '.join(industry_items[:opts['top_industries']])}"
+        prompt = f"""
+[가맹점 기본 정보]
+- 가맹점명: {store_name}, 업종: {industry}, 개설일: {open_date}, {close_info}
+
+[AI 정밀 진단 요약]
+- 폐업 위험도: {closure_risk}, 주요 원인: {closure_factors}
+- 고객 유형: {customer_type}, 가게 경쟁력: {competitiveness}, 고객 관계: {customer_relation}
+- 상권 이름: {local_district_name}
+{district_text}
+- 인근 동종 업종: {nearby_competition_info}
+
+[주요 지표 3개월 추세]
+{trend_text}
+""".strip()
+        prompt_tokens = estimate_tokens(prompt)
+        if prompt_tokens <= store_budget:
+            break
+
+    # 마지막 단계로도 넘으면, 끝(추세 → 상권 정보 → 진단 요약 순)에서부터 한 줄씩 잘라 예산에 맞춥니다.
+    truncated_lines = 0
+    if prompt_tokens > store_budget:
+        level = len(levels)
+        lines = prompt.split("\n")
+        while len(lines) > PROMPT_KEEP_LINES and estimate_tokens("\n".join(lines)) > store_budget:
+            lines.pop()
+            truncated_lines += 1
+        prompt = "\n".join(lines).strip()
+        prompt_tokens = estimate_tokens(prompt)
+        if prompt_tokens > store_budget:
+            raise ValueError(
+                f"시스템 지침({system_tokens})과 가맹점 기본 정보만으로도 입력 토큰 예산({token_budget})을 넘습니다. "
+                "PROMPT_TOKEN_BUDGET 을 늘려주세요."
+            )
+
+    legacy_prompt = build_legacy_prompt(
+        store_name=store_name, industry=industry, open_date=open_date, close_date=close_date,
+        closure_risk=closure_risk, closure_factors=closure_factors,
+        customer_type=customer_type, competitiveness=competitiveness, customer_relation=customer_relation,
+        local_district_name=local_district_name, local_industry_info=local_industry_info,
+        trends=trends, nearby_competition_info=nearby_competition_info
+    )
+    legacy_tokens = estimate_tokens(legacy_prompt)
+    stats = {
+        "budget": token_budget,
+        "store_budget": store_budget,
+        "compaction_level": level,
+        "truncated_lines": truncated_lines,
+        "prompt_tokens_est": prompt_tokens,
+        "system_tokens_est": system_tokens,
+        "legacy_tokens_est": legacy_tokens,
+        "saved_tokens_est": legacy_tokens - (prompt_tokens + system_tokens),
+        "district_brief_id": district_brief["brief_id"] if district_brief is not None else None,
+    }
+    return prompt, stats
+
+# ----------------------------------------------------------------------
+# 3-2. 구조화 출력 스키마 및 부분 복구
+# ----------------------------------------------------------------------
+# AI 리포트 응답 스키마 (한 곳에서만 정의하고, 모델의 response_schema 와 응답 검증에 모두 사용)
+REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "store_summary": {"type": "string"},
+        "risk_signal": {"type": "string"},
+        "opportunity_signal": {"type": "string"},
+        "action_plan_title": {"type": "string"},
+        "action_plan_detail": {"type": "string"},
+        "fact_based_example": {"type": "string"},
+        "example_source": {"type": "string"},
+        "action_table": {"type": "string"},
+        "expected_effect": {"type": "string"},
+        "encouragement": {"type": "string"},
+        "local_event_recommendation": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "details": {"type": "string"},
+                "source": {"type": "string"},
+            },
+            "required": ["title", "details", "source"],
+        },
+    },
+    "required": [
+        "store_summary", "risk_signal", "opportunity_signal", "action_plan_title", "action_plan_detail",
+        "fact_based_example", "example_source", "action_table", "expected_effect", "encouragement",
+        "local_event_recommendation",
+    ],
+}
+
+# 누락 항목 재요청 최대 횟수
+MAX_REPAIR_ATTEMPTS = 1
+
+def report_generation_config(fields=None):
+    """스키마 기반 JSON 출력 설정을 반환합니다. fields 를 주면 해당 항목만 포함한 부분 스키마를 사용합니다."""
+    schema = REPORT_SCHEMA
+    if fields is not None:
+        schema = {
+            "type": "object",
+            "properties": {k: REPORT_SCHEMA["properties"][k] for k in fields},
+            "required": list(fields),
+        }
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+@st.cache_resource
+def get_gemini_model(api_key):
+    """고정 지침과 응답 스키마를 등록한 모델 객체를 만들어 모든 세션에서 재사용합니다."""
+    genai = get_genai()
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(
+        'gemini-2.5-flash',
+        system_instruction=SYSTEM_INSTRUCTION,
+        generation_config=report_generation_config(),
+    )
+
+# 1 로 설정하면 리포트마다 기존 방식(전체 프롬프트, 시스템 지침·스키마 없음)으로도 한 번 더 호출해 지연시간을 비교합니다.
+# API 호출이 2배가 되므로 측정할 때만 켜세요. (환경변수 LEGACY_LATENCY_BASELINE)
+LEGACY_LATENCY_BASELINE = os.environ.get("LEGACY_LATENCY_BASELINE", "0") == "1"
+
+@st.cache_resource
+def get_legacy_gemini_model(api_key):
+    """지연시간 비교 기준용: 기존 방식 그대로 지침·스키마를 등록하지 않은 모델 객체입니다."""
+    genai = get_genai()
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-2.5-flash')
+
+def measure_legacy_latency(api_key, legacy_prompt):
+    """기존 프롬프트로 한 번 호출해 (지연시간 초, usage_metadata)를 반환합니다."""
+    started_at = time.perf_counter()
+    response = get_legacy_gemini_model(api_key).generate_content(legacy_prompt)
+    return time.perf_counter() - started_at, getattr(response, "usage_metadata", None)
+
+def _is_valid_field(value, field_schema):
+    """값이 스키마 항목(문자열/객체)에 맞는지 확인합니다."""
+    if field_schema["type"] == "string":
+        return isinstance(value, str) and value.strip() != ""
+    if field_schema["type"] == "object":
+        return isinstance(value, dict) and all(
+            _is_valid_field(value.get(k), field_schema["properties"][k]) for k in field_schema.get("required", [])
+        )
+    return value is not None
+
+def _recover_fields(text, properties):
+    """
+    깨진(잘림/잡음 포함) JSON 텍스트에서 "키": 값 쌍을 하나씩 찾아 온전한 값만 복구합니다.
+    객체 값이 잘려 있으면 그 안의 하위 항목을 같은 방식으로 복구합니다.
+    """
+    decoder = json.JSONDecoder()
+    recovered = {}
+    for key, field_schema in properties.items():
+        for match in re.finditer(r'"%s"\s*:\s*' % re.escape(key), text):
+            try:
+                value, _ = decoder.raw_decode(text, match.end())
+            except json.JSONDecodeError:
+                if field_schema["type"] == "object" and text[match.end():match.end() + 1] == "{":
+                    value = _recover_fields(text[match.end():], field_schema["properties"])
+                else:
+                    continue
+            if _is_valid_field(value, field_schema):
+                recovered[key] = value
+                break
+    return recovered
+
+def parse_report_response(text, fields=None):
+    """
+    AI 응답 텍스트를 스키마 기준으로 해석합니다. fields 를 주면 그 항목만 필수로 봅니다.
+    (유효한 항목 딕셔너리, 누락/불량 항목 이름 리스트)를 반환합니다.
+    """
+    properties = REPORT_SCHEMA["properties"]
+    cleaned_text = (text or "").strip().replace("```json", "").replace("```", "")
+    try:
+        data = json.loads(cleaned_text)
+        if not isinstance(data, dict):
+            raise json.JSONDecodeError("JSON 객체가 아닙니다.", cleaned_text, 0)
+        report = {k: v for k, v in data.items() if k in properties and _is_valid_field(v, properties[k])}
+    except json.JSONDecodeError:
+        report = _recover_fields(cleaned_text, properties)
+    missing = [k for k in (fields or REPORT_SCHEMA["required"]) if k not in report]
+    return report, missing
+
+# 생성된 AI 리포트 저장 위치 (가맹점ID별 JSON, export_reports.py 내보내기에서 재사용)
+AI_REPORT_CACHE_DIR = "ai_report_cache"
+
+def save_ai_report(store_id, report):
+    """
+    생성된 AI 리포트를 가맹점ID별 JSON 파일로 저장합니다. 저장에 실패해도 화면 표시는 계속합니다.
+    같은 가게를 여러 세션이 동시에 저장할 수 있으므로 임시 파일에 쓴 뒤 교체하고, 실패하면 임시 파일을 지웁니다.
+    """
+    if pd.isna(store_id):
+        return
+    tmp_path = None
+    try:
+        os.makedirs(AI_REPORT_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=AI_REPORT_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(AI_REPORT_CACHE_DIR, f"{store_id}.json"))
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_cached_ai_report(store_id):
+    """저장된 AI 리포트를 불러옵니다. 없거나 읽을 수 없는(깨진) 파일이면 None 을 반환합니다."""
+    path = os.path.join(AI_REPORT_CACHE_DIR, f"{store_id}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return report if isinstance(report, dict) else None
+
+def request_missing_fields(model, prompt, report, missing, fields=None):
+    """누락된 항목만 부분 스키마로 다시 요청해 기존 결과에 합칩니다. (합친 결과, 남은 누락 항목, 응답)을 반환합니다."""
+    repair_prompt = (
+        f"{prompt}\n\n[이미 작성된 리포트 항목]\n{json.dumps(report, ensure_ascii=False)}\n\n"
+        f"위 내용과 일관되게, 다음 항목만 JSON으로 작성해주세요: {', '.join(missing)}"
+    )
+    response = model.generate_content(repair_prompt, generation_config=report_generation_config(missing))
+    repaired, _ = parse_report_response(response.text)
+    merged = {**report, **{k: v for k, v in repaired.items() if k in missing}}
+    still_missing = [k for k in (fields or REPORT_SCHEMA["required"]) if k not in merged]
+    return merged, still_missing, response
+
+# ----------------------------------------------------------------------
+# 3-3. 상권 × 업종 AI 브리프 (그룹별 1회 생성, 같은 그룹 가게들이 재사용)
+# ----------------------------------------------------------------------
+# 브리프 저장 위치 (브리프ID별 JSON)
+DISTRICT_BRIEF_DIR = "district_briefs"
+# 브리프 지침/스키마를 바꾸면 올려주세요. 버전이 다른 브리프는 만료로 보고 다시 생성합니다.
+DISTRICT_BRIEF_VERSION = 1
+# 브리프 유효 기간 (환경변수 DISTRICT_BRIEF_MAX_AGE_DAYS 로 조정, 앱과 refresh_district_briefs.py 가 같은 값을 사용)
+DISTRICT_BRIEF_MAX_AGE_DAYS = int(os.environ.get("DISTRICT_BRIEF_MAX_AGE_DAYS", "30"))
+# 상권을 특정할 수 없는 값 (브리프를 만들지 않고 기존처럼 가게별 리포트에서 추론)
+NO_DISTRICT_VALUES = {"상권없음", "정보 없음"}
+
+DISTRICT_BRIEF_INSTRUCTION = """
+당신은 대한민국 골목상권 분석가입니다.
+사용자가 제공하는 [상권 정보]를 바탕으로, 해당 상권의 특징과 그 상권의 같은 업종 가게들이 공통으로 활용할 수 있는
+지역 연계 마케팅 아이디어를 JSON 형식으로 작성해주세요. 이 브리프는 같은 상권·업종의 여러 가게 리포트에 그대로 재사용됩니다.
+
+1. 'district_traits': 상권의 특징 (유동인구 연령대, 오피스/주거/관광 상권 여부 등)을 **사전 학습된 지식**으로 추론해 1~2문장으로 요약해주세요.
+2. 'key_customers': 이 상권에서 해당 업종의 주요 고객층을 한 문장으로 적어주세요.
+3. 'local_event_recommendation' (title, details, source): 상권 특징과 업종을 연계한 **마케팅 아이디어** 1개를 제안해주세요.
+   - 특정 가게가 아니라 이 상권의 같은 업종 가게라면 누구나 실행할 수 있는 아이디어여야 합니다.
+   - [중요] **절대 실시간 웹 검색을 시도하거나 '오늘' 날짜의 이벤트를 찾으려고 하지 마세요.**
+   - 확실한 URL이 없다면 "출처 없음"으로 응답하고, 절대 URL을 지어내지 마세요.
+""".strip()
+
+DISTRICT_BRIEF_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "district_traits": {"type": "string"},
+        "key_customers": {"type": "string"},
+        "local_event_recommendation": REPORT_SCHEMA["properties"]["local_event_recommendation"],
+    },
+    "required": ["district_traits", "key_customers", "local_event_recommendation"],
+}
+
+# 브리프가 있을 때 가게별 리포트에서 요청하는 항목 (지역 연계 제안은 브리프의 것을 그대로 사용)
+BRIEFED_REPORT_FIELDS = [k for k in REPORT_SCHEMA["required"] if k != "local_event_recommendation"]
+
+def has_district(district):
+    """브리프를 만들 수 있는 (특정 가능한) 상권 이름인지 확인합니다."""
+    return not pd.isna(district) and str(district).strip() != "" and district not in NO_DISTRICT_VALUES
+
+def district_brief_id(district, industry):
+    """상권 × 업종 그룹의 브리프 ID (예: DB-3f2a9c01b7) 를 만듭니다."""
+    return "DB-" + hashlib.md5(f"{district}|{industry}".encode("utf-8")).hexdigest()[:10]
+
+def _district_brief_path(brief_id):
+    return os.path.join(DISTRICT_BRIEF_DIR, f"{brief_id}.json")
+
+def load_district_brief(district, industry):
+    """저장된 브리프를 불러옵니다. 없거나 읽을 수 없으면 None 을 반환합니다."""
+    if not has_district(district) or pd.isna(industry):
+        return None
+    try:
+        with open(_district_brief_path(district_brief_id(district, industry)), encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if _is_valid_field(record.get("brief"), DISTRICT_BRIEF_SCHEMA) else None
+
+def is_district_brief_stale(record):
+    """버전이 다르거나 유효 기간(DISTRICT_BRIEF_MAX_AGE_DAYS)이 지난 브리프인지 확인합니다."""
+    if record.get("version") != DISTRICT_BRIEF_VERSION:
+        return True
+    try:
+        generated_at = datetime.fromisoformat(record["generated_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return (datetime.now() - generated_at).days >= DISTRICT_BRIEF_MAX_AGE_DAYS
+
+def save_district_brief(record):
+    """
+    브리프를 저장하고 성공 여부를 반환합니다.
+    여러 세션/프로세스가 동시에 읽을 수 있으므로 임시 파일에 쓴 뒤 교체하고, 실패하면 임시 파일을 지웁니다.
+    """
+    tmp_path = None
+    try:
+        os.makedirs(DISTRICT_BRIEF_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=DISTRICT_BRIEF_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, _district_brief_path(record["brief_id"]))
+        return True
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def build_district_brief_prompt(district, industry, data):
+    """브리프 생성용 프롬프트 (상권 이름, 업종, 상권 내 가게 수와 주요 업종)를 만듭니다."""
+    district_df = data[data['상권'] == district]
+    group_count = int((district_df['업종'] == industry).sum())
+    top_industries = ", ".join(f"{name} ({count}개)" for name, count in district_df['업종'].value_counts().nlargest(5).items())
+    return f"""
+[상권 정보]
+- 상권 이름: {district}, 업종: {industry}
+- 상권 내 가게 수: {len(district_df)}개 (같은 업종 {group_count}개)
+- 상권 내 주요 업종: {top_industries or "데이터 없음"}
+""".strip()
+
+@st.cache_resource
+def get_district_brief_model(api_key):
+    """브리프 전용 지침과 스키마를 등록한 모델 객체를 만들어 재사용합니다."""
+    genai = get_genai()
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(
+        'gemini-2.5-flash',
+        system_instruction=DISTRICT_BRIEF_INSTRUCTION,
+        generation_config={"response_mime_type": "application/json", "response_schema": DISTRICT_BRIEF_SCHEMA},
+    )
+
+def generate_district_brief(model, district, industry, data):
+    """
+    브리프를 새로 생성해 (기록 딕셔너리, 응답)을 반환합니다. 응답이 불완전하면 기록은 None 입니다.
+    저장은 하지 않으므로 호출하는 쪽에서 save_district_brief 로 저장합니다.
+    """
+    response = model.generate_content(build_district_brief_prompt(district, industry, data))
+    text = (response.text or "").strip().replace("```json", "").replace("```", "")
+    try:
+        brief = json.loads(text)
+    except json.JSONDecodeError:
+        brief = _recover_fields(text, DISTRICT_BRIEF_SCHEMA["properties"])
+    if not _is_valid_field(brief, DISTRICT_BRIEF_SCHEMA):
+        return None, response
+    record = {
+        "brief_id": district_brief_id(district, industry),
+        "version": DISTRICT_BRIEF_VERSION,
+        "district": district,
+        "industry": industry,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "brief": {k: brief[k] for k in DISTRICT_BRIEF_SCHEMA["required"]},
+    }
+    return record, response
+
+def get_or_create_district_brief(api_key, district, industry, data):
+    """
+    유효한 브리프가 있으면 그대로, 없거나 만료됐으면 새로 생성·저장해 반환합니다.
+    새로 생성하지 못하면 만료된 브리프라도 돌려주고, 그것도 없으면 None 을 반환합니다.
+    (브리프 기록, 호출 통계)를 반환하며, 호출 통계는 API 를 부르지 않았으면 None 입니다.
+    """
+    record = load_district_brief(district, industry)
+    if record is not None and not is_district_brief_stale(record):
+        return record, None
+    if not has_district(district) or pd.isna(industry):
+        return None, None
+    started_at = time.perf_counter()
+    call_stats = {"latency_sec": None, "prompt_tokens": None, "output_tokens": None, "generated": False, "saved": False}
+    try:
+        new_record, response = generate_district_brief(get_district_brief_model(api_key), district, industry, data)
+    except Exception:
+        new_record, response = None, None
+    call_stats["latency_sec"] = time.perf_counter() - started_at
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        call_stats["prompt_tokens"] = getattr(usage, "prompt_token_count", None)
+        call_stats["output_tokens"] = getattr(usage, "candidates_token_count", None)
+    if new_record is None:
+        return record, call_stats
+    call_stats["generated"] = True
+    call_stats["saved"] = save_district_brief(new_record) # 저장에 실패해도 이번 리포트에는 사용
+    return new_record, call_stats
+
+def district_brief_summary(record):
+    """가게별 프롬프트에 넣을 브리프 요약 한 줄을 만듭니다."""
+    brief = record["brief"]
+    return f"[{record['brief_id']} v{record['version']}] {brief['district_traits']} 주요 고객: {brief['key_customers']}"
+
 def format_value(value, unit="", default_text="--"):
     """st.metric 값을 포맷팅합니다."""
     if pd.isna(value):
@@ -179,6 +990,20 @@ def format_trend_with_arrows(trend_value):
     
     return trend_value
 
+def risk_css_class(risk_level_text):
+    """폐업 위험도 텍스트에 맞는 CSS 클래스를 반환합니다."""
+    if "낮음" in risk_level_text: return "risk-low"
+    if "높음" in risk_level_text: return "risk-high"
+    if "중간" in risk_level_text or "보통" in risk_level_text: return "risk-medium"
+    return "risk-default"
+
+def format_peer_rank(rank):
+    """peer_rank 결과를 메트릭 박스 하단의 '상위 N%' HTML로 변환합니다."""
+    if rank is None:
+        return ""
+    top, label, n = rank
+    return f"<div class='metric-peer'>🏅 {label} {n}곳 중 <b>상위 {top}%</b></div>"
+
 # ----------------------------------------------------------------------
 # 5. 차트 생성 헬퍼 함수
 # ----------------------------------------------------------------------
@@ -202,190 +1027,314 @@ def plot_bar_chart(ax, x, months, data_series, labels, title, colors):
     ax.legend(fontsize=9)
     ax.grid(True, axis='y', linestyle='--', alpha=0.5)
 
+# --- 차트 크기/너비 설정 ---
+CHART_MONTHS = ['3개월 전', '2개월 전', '1개월 전']
+CHART_FIGSIZE = (6, 3.5)
+CHART_WIDTH = 550
+# ---------------------------
+
+# [수정] tab2 차트 정의 (앱 화면과 export_reports.py 내보내기에서 공용으로 사용)
+CHART_SECTIONS = [
+    ("고객 및 상권 동향", [
+        dict(kind="line", title="고객 유형 비율", metrics=['유동고객비율', '직장고객비율', '거주고객비율'],
+             labels=['유동고객', '직장고객', '거주고객'], colors=['steelblue', 'gray', 'darkgreen'], markers=['o', 's', '^'], empty="고객 유형 비율"),
+        dict(kind="line", title="신규/재방문 고객", metrics=['신규고객비율', '재방문율'],
+             labels=['신규고객', '재방문율'], colors=['skyblue', 'salmon'], markers=['o', 's'], empty="신규/재방문 고객"),
+        dict(kind="line", title="폐업 비율", metrics=['상권내폐업비율', '업종내폐업비율'],
+             labels=['상권내폐업', '업종내폐업'], colors=['gray', 'black'], markers=['o', 's'], empty="폐업 비율"),
+    ]),
+    ("매출 성과", [
+        dict(kind="bar", title="매출 순위 비율 (상위 N%)", metrics=['상권내매출순위비율', '업종내매출순위비율'],
+             labels=['상권내', '업종내'], colors=['lightgray', 'steelblue'], empty="매출 순위 비율"),
+        dict(kind="bar", title="매출 건수/금액 (구간)", metrics=['매출건수구간', '매출금액구간'],
+             labels=['건수', '금액'], colors=['gray', 'darkgreen'], empty="매출 건수/금액"),
+    ]),
+]
+
+def chart_series(store_data, spec):
+    """차트 정의에 해당하는 지표별 3개월(3m, 2m, 1m) 값 목록을 반환합니다."""
+    return [[store_data.get(f'{metric}_{m}m') for m in [3, 2, 1]] for metric in spec["metrics"]]
+
+def render_chart_png(store_data, spec, series=None):
+    """차트 정의대로 그래프를 그려 PNG 바이트로 반환합니다. 데이터가 모두 비어 있으면 None 을 반환합니다."""
+    series = chart_series(store_data, spec) if series is None else series
+    if not pd.Series([v for values in series for v in values]).notna().any():
+        return None
+    plt = get_pyplot()
+    fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
+    if spec["kind"] == "line":
+        plot_line_chart(ax, CHART_MONTHS, series, spec["labels"], spec["title"], spec["colors"], spec["markers"])
+    else:
+        plot_bar_chart(ax, range(len(CHART_MONTHS)), CHART_MONTHS, series, spec["labels"], spec["title"], spec["colors"])
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    plt.close(fig)
+    return buf.getvalue()
+
+def chart_img_tag(png, width=CHART_WIDTH):
+    """PNG 바이트를 확대 효과가 있는 인라인(base64) <img> 태그로 변환합니다."""
+    img_data = base64.b64encode(png).decode()
+    return f"<img src='data:image/png;base64,{img_data}' width='{width}' class='zoom-chart'>"
+
 # ----------------------------------------------------------------------
 # 6. UI 구성 함수 (리포트, 홈페이지)
 # ----------------------------------------------------------------------
-def show_report(store_data, data):
-    """상세 리포트 화면을 그립니다."""
-    
-    # [수정] UI/UX 개선을 위한 맞춤형 CSS
-    st.markdown("""
-    <style>
-    /* ---------------------------------- */
-    /* 1. 기본/메트릭 (테마 호환) */
-    /* ---------------------------------- */
-    .stApp {
-        background-color: var(--background-color);
-    }
+# [수정] 리포트 화면 CSS (앱과 export_reports.py 의 정적 HTML 내보내기에서 공용으로 사용)
+REPORT_CSS = """
+/* ---------------------------------- */
+/* 1. 기본/메트릭 (테마 호환) */
+/* ---------------------------------- */
+.stApp {
+    background-color: var(--background-color);
+}
+.metric-box {
+    border-radius: 10px; padding: 15px;
+    text-align: center; height: 100%;
+    display: flex; flex-direction: column; justify-content: center;
+    border: 1px solid var(--gray-30);
+    background-color: var(--secondary-background-color); /* [수정] 테마 호환 */
+    transition: box-shadow 0.3s ease-in-out;
+}
+.metric-box:hover { box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
+.metric-label { 
+    font-size: 0.9em; 
+    color: var(--gray-70); /* [수정] 테마 호환 */
+    margin-bottom: 8px; font-weight: bold; 
+}
+.metric-value { 
+    font-size: 1.5em; font-weight: 600; 
+    color: var(--text-color); /* [수정] 테마 호환 */
+    word-wrap: break-word; margin-bottom: 8px; 
+}
+.metric-trend { font-size: 0.9em; line-height: 1.5; }
+.metric-peer { font-size: 0.85em; color: var(--gray-70); margin-top: 6px; }
+
+.box-color-1 { border-left: 5px solid #85C1E9; } 
+.box-color-2 { border-left: 5px solid #82E0AA; } 
+.box-color-3 { border-left: 5px solid #F7DC6F; } 
+.box-color-4 { border-left: 5px solid #F0B27A; } 
+.box-color-5 { border-left: 5px solid #D7BDE2; } 
+.box-color-6 { border-left: 5px solid #A3E4D7; } 
+
+/* ---------------------------------- */
+/* 2. 폐업 위험도 (라이트 모드) */
+/* ---------------------------------- */
+.risk-container {
+    border-radius: 10px; padding: 20px;
+    display: flex; align-items: center;
+    border: 1px solid var(--gray-30);
+}
+.risk-level {
+    flex: 2;
+    font-weight: bold; font-size: 1.2em; text-align: center;
+    padding: 1rem; border-radius: 0.5rem;
+}
+.risk-factors {
+    flex: 5;
+    padding-left: 20px;
+    border-left: 1px solid var(--gray-30);
+}
+/* 라이트모드 기본값 */
+.risk-low { color: #0050b3; background-color: #e6f7ff; }
+.risk-high { color: #a8071a; background-color: #fff1f0; }
+.risk-medium { color: #237804; background-color: #f6ffed; }
+.risk-default { color: #595959; background-color: #fafafa; }
+
+/* ---------------------------------- */
+/* 3. 상권 현황 (테마 호환) */
+/* ---------------------------------- */
+.bar-chart-container { border: 1px solid var(--gray-30); border-radius: 10px; padding: 20px; }
+.bar-chart-header { display: flex; font-weight: bold; color: var(--gray-70); margin-bottom: 10px; }
+.bar-chart-row { display: flex; align-items: center; margin-bottom: 8px; font-size: 0.9em; }
+.bar-chart-label { flex: 2; text-align: left; padding-right: 10px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
+.bar-chart-bar-container { flex: 5; background-color: var(--gray-20); border-radius: 5px; }
+.bar-chart-bar { background-color: #5c9ce5; height: 20px; border-radius: 5px; }
+
+/* ---------------------------------- */
+/* 4. 차트 확대 효과 (기존과 동일) */
+/* ---------------------------------- */
+.zoom-chart {
+  transition: transform 0.2s ease-in-out; 
+  cursor: zoom-in;
+}
+.zoom-chart:hover {
+  transform: scale(1.15); 
+  z-index: 10; position: relative; 
+  box-shadow: 0 8px 16px rgba(0,0,0,0.2);
+  border-radius: 5px;
+}
+
+/* ---------------------------------- */
+/* 5. 탭 스타일 (라이트 모드) */
+/* ---------------------------------- */
+div[data-testid="stTabs"] button {
+    background-color: transparent !important; 
+    border: none !important;                 
+    border-radius: 8px !important;           
+    padding-top: 0.5em !important;    
+    padding-bottom: 0.5em !important; 
+    padding-left: 0.75em !important;  
+    padding-right: 0.75em !important; 
+    margin-right: 5px !important;     
+    transition: transform 0.2s ease-in-out, background-color 0.2s;
+}
+div[data-testid="stTabs"] button > div {
+    font-size: 1.2em !important;   
+    font-weight: bold !important;
+    color: var(--gray-70) !important; /* [수정] 테마 호환 */
+}
+div[data-testid="stTabs"] button:hover:not([aria-selected="true"]) {
+    transform: scale(1.1); 
+    background-color: var(--gray-20) !important; /* [수정] 테마 호환 */
+}
+div[data-testid="stTabs"] button[aria-selected="true"] {
+    background-color: #E6E6FA !important;    /* 라이트: 연보라 배경 */
+    border: 1px solid #D8BFD8 !important; 
+    border-radius: 8px !important;           
+    transform: none; 
+}
+div[data-testid="stTabs"] button[aria-selected="true"] > div {
+    color: #4B0082 !important; /* 라이트: 진보라 글씨 */
+}
+div[data-testid="stTabs"] > div:first-child {
+   border-bottom: 2px solid var(--gray-30);
+   margin-bottom: 10px;
+}
+
+/* ---------------------------------- */
+/* 6. 제목/탭 간격 (기존과 동일) */
+/* ---------------------------------- */
+div[data-testid="stTitle"] {
+  margin-bottom: 25px !important; 
+}
+div[data-testid="stTabs"] {
+  margin-bottom: 25px !important; 
+}
+
+/* ---------------------------------- */
+/* 7. [!!!핵심!!!] 다크 모드 오버라이드 */
+/* ---------------------------------- */
+@media (prefers-color-scheme: dark) {
+    /* 다크모드일 때 .metric-box 테두리 */
     .metric-box {
-        border-radius: 10px; padding: 15px;
-        text-align: center; height: 100%;
-        display: flex; flex-direction: column; justify-content: center;
-        border: 1px solid var(--gray-30);
-        background-color: var(--secondary-background-color); /* [수정] 테마 호환 */
-        transition: box-shadow 0.3s ease-in-out;
-    }
-    .metric-box:hover { box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
-    .metric-label { 
-        font-size: 0.9em; 
-        color: var(--gray-70); /* [수정] 테마 호환 */
-        margin-bottom: 8px; font-weight: bold; 
-    }
-    .metric-value { 
-        font-size: 1.5em; font-weight: 600; 
-        color: var(--text-color); /* [수정] 테마 호환 */
-        word-wrap: break-word; margin-bottom: 8px; 
-    }
-    .metric-trend { font-size: 0.9em; line-height: 1.5; }
-    
-    .box-color-1 { border-left: 5px solid #85C1E9; } 
-    .box-color-2 { border-left: 5px solid #82E0AA; } 
-    .box-color-3 { border-left: 5px solid #F7DC6F; } 
-    .box-color-4 { border-left: 5px solid #F0B27A; } 
-    .box-color-5 { border-left: 5px solid #D7BDE2; } 
-    .box-color-6 { border-left: 5px solid #A3E4D7; } 
-
-    /* ---------------------------------- */
-    /* 2. 폐업 위험도 (라이트 모드) */
-    /* ---------------------------------- */
-    .risk-container {
-        border-radius: 10px; padding: 20px;
-        display: flex; align-items: center;
-        border: 1px solid var(--gray-30);
-    }
-    .risk-level {
-        flex: 2;
-        font-weight: bold; font-size: 1.2em; text-align: center;
-        padding: 1rem; border-radius: 0.5rem;
-    }
-    .risk-factors {
-        flex: 5;
-        padding-left: 20px;
-        border-left: 1px solid var(--gray-30);
-    }
-    /* 라이트모드 기본값 */
-    .risk-low { color: #0050b3; background-color: #e6f7ff; }
-    .risk-high { color: #a8071a; background-color: #fff1f0; }
-    .risk-medium { color: #237804; background-color: #f6ffed; }
-    .risk-default { color: #595959; background-color: #fafafa; }
-
-    /* ---------------------------------- */
-    /* 3. 상권 현황 (테마 호환) */
-    /* ---------------------------------- */
-    .bar-chart-container { border: 1px solid var(--gray-30); border-radius: 10px; padding: 20px; }
-    .bar-chart-header { display: flex; font-weight: bold; color: var(--gray-70); margin-bottom: 10px; }
-    .bar-chart-row { display: flex; align-items: center; margin-bottom: 8px; font-size: 0.9em; }
-    .bar-chart-label { flex: 2; text-align: left; padding-right: 10px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
-    .bar-chart-bar-container { flex: 5; background-color: var(--gray-20); border-radius: 5px; }
-    .bar-chart-bar { background-color: #5c9ce5; height: 20px; border-radius: 5px; }
-    
-    /* ---------------------------------- */
-    /* 4. 차트 확대 효과 (기존과 동일) */
-    /* ---------------------------------- */
-    .zoom-chart {
-      transition: transform 0.2s ease-in-out; 
-      cursor: zoom-in;
-    }
-    .zoom-chart:hover {
-      transform: scale(1.15); 
-      z-index: 10; position: relative; 
-      box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-      border-radius: 5px;
+        border: 1px solid var(--gray-70);
     }
 
-    /* ---------------------------------- */
-    /* 5. 탭 스타일 (라이트 모드) */
-    /* ---------------------------------- */
-    div[data-testid="stTabs"] button {
-        background-color: transparent !important; 
-        border: none !important;                 
-        border-radius: 8px !important;           
-        padding-top: 0.5em !important;    
-        padding-bottom: 0.5em !important; 
-        padding-left: 0.75em !important;  
-        padding-right: 0.75em !important; 
-        margin-right: 5px !important;     
-        transition: transform 0.2s ease-in-out, background-color 0.2s;
-    }
-    div[data-testid="stTabs"] button > div {
-        font-size: 1.2em !important;   
-        font-weight: bold !important;
-        color: var(--gray-70) !important; /* [수정] 테마 호환 */
-    }
-    div[data-testid="stTabs"] button:hover:not([aria-selected="true"]) {
-        transform: scale(1.1); 
-        background-color: var(--gray-20) !important; /* [수정] 테마 호환 */
-    }
+    /* 다크모드일 때 폐업 위험도 색상 반전 */
+    .risk-low { color: #91d5ff; background-color: #111a2c; }
+    .risk-high { color: #ffa39e; background-color: #2c1618; }
+    .risk-medium { color: #b7eb8f; background-color: #1a2b16; }
+    .risk-default { color: #fafafa; background-color: #262730; }
+
+    /* 다크모드일 때 탭 버튼 색상 반전 */
     div[data-testid="stTabs"] button[aria-selected="true"] {
-        background-color: #E6E6FA !important;    /* 라이트: 연보라 배경 */
-        border: 1px solid #D8BFD8 !important; 
-        border-radius: 8px !important;           
-        transform: none; 
+        background-color: #4B0082 !important;    /* 다크: 진보라 배경 */
+        border: 1px solid #E6E6FA !important; 
     }
     div[data-testid="stTabs"] button[aria-selected="true"] > div {
-        color: #4B0082 !important; /* 라이트: 진보라 글씨 */
-    }
-    div[data-testid="stTabs"] > div:first-child {
-       border-bottom: 2px solid var(--gray-30);
-       margin-bottom: 10px;
+        color: #E6E6FA !important; /* 다크: 연보라 글씨 */
     }
+}
 
-    /* ---------------------------------- */
-    /* 6. 제목/탭 간격 (기존과 동일) */
-    /* ---------------------------------- */
-    div[data-testid="stTitle"] {
-      margin-bottom: 25px !important; 
-    }
-    div[data-testid="stTabs"] {
-      margin-bottom: 25px !important; 
-    }
+/* ---------------------------------- */
+/* 8. [추가] st.success/info/error 텍스트 겹침 방지 */
+/* ---------------------------------- */
+div[data-testid="stNotification"] {
+    word-break: keep-all;     /* 1. 한글 단어가 중간에 깨지는 것을 방지 */
+    overflow-wrap: break-word;/* 2. 1015%p처럼 긴 문자열이 넘칠 경우 강제 줄바꿈 */
+    line-height: 1.6em;       /* 3. 줄간격을 넉넉하게 확보 */
+}
+"""
 
-    /* ---------------------------------- */
-    /* 7. [!!!핵심!!!] 다크 모드 오버라이드 */
-    /* ---------------------------------- */
-    @media (prefers-color-scheme: dark) {
-        /* 다크모드일 때 .metric-box 테두리 */
-        .metric-box {
-            border: 1px solid var(--gray-70);
-        }
+# ----------------------------------------------------------------------
+# 6-1. 정적 자산 (CSS/HTML) 공유 제공
+# ----------------------------------------------------------------------
+# server.enableStaticServing=true (.streamlit/config.toml) 이면 ./static 폴더가 /app/static/ 경로로 제공됩니다.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL_PREFIX = "app/static"
 
-        /* 다크모드일 때 폐업 위험도 색상 반전 */
-        .risk-low { color: #91d5ff; background-color: #111a2c; }
-        .risk-high { color: #ffa39e; background-color: #2c1618; }
-        .risk-medium { color: #b7eb8f; background-color: #1a2b16; }
-        .risk-default { color: #fafafa; background-color: #262730; }
+def publish_static_asset(name, ext, content):
+    """
+    내용 해시를 넣은 파일명(name.<hash>.ext)으로 static 폴더에 저장하고 URL을 반환합니다.
+    파일명이 내용마다 달라서 브라우저가 안전하게 캐시할 수 있습니다. 정적 제공이 불가능하면 None 을 반환합니다.
+    """
+    if not st.get_option("server.enableStaticServing"):
+        return None
+    data = content.encode("utf-8")
+    filename = f"{name}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}"
+    path = os.path.join(STATIC_DIR, filename)
+    # 같은 이름의 파일은 다시 쓰지 않으므로, 잘린 파일이 남지 않도록 임시 파일에 다 쓴 뒤 교체합니다.
+    # (이전에 크기가 다른 파일이 남아 있으면 다시 씁니다.)
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        return f"{STATIC_URL_PREFIX}/{filename}"
+    tmp_path = None
+    try:
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=STATIC_DIR, prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644) # mkstemp 기본 권한(0600)은 다른 사용자로 도는 웹 서버가 읽지 못함
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    return f"{STATIC_URL_PREFIX}/{filename}"
 
-        /* 다크모드일 때 탭 버튼 색상 반전 */
-        div[data-testid="stTabs"] button[aria-selected="true"] {
-            background-color: #4B0082 !important;    /* 다크: 진보라 배경 */
-            border: 1px solid #E6E6FA !important; 
-        }
-        div[data-testid="stTabs"] button[aria-selected="true"] > div {
-            color: #E6E6FA !important; /* 다크: 연보라 글씨 */
-        }
+def _record_asset_payload(name, inline_bytes, per_rerun_bytes, url):
+    """자산별로 '인라인 전송 시 바이트' 대비 '실제 매 실행 전송 바이트'를 시작 프로파일에 기록합니다."""
+    get_startup_profile().setdefault("static_assets", {})[name] = {
+        "url": url, "inline_bytes": inline_bytes, "per_rerun_bytes": per_rerun_bytes,
+        "saved_bytes_per_rerun": inline_bytes - per_rerun_bytes,
     }
+    _emit_startup_profile("static_asset")
 
-    /* ---------------------------------- */
-    /* 8. [추가] st.success/info/error 텍스트 겹침 방지 */
-    /* ---------------------------------- */
-    div[data-testid="stNotification"] {
-        word-break: keep-all;     /* 1. 한글 단어가 중간에 깨지는 것을 방지 */
-        overflow-wrap: break-word;/* 2. 1015%p처럼 긴 문자열이 넘칠 경우 강제 줄바꿈 */
-        line-height: 1.6em;       /* 3. 줄간격을 넉넉하게 확보 */
-    }
+@st.cache_resource
+def get_report_css_tag():
+    """리포트 CSS를 정적 파일로 한 번만 만들어, 매 실행 주입할 태그를 반환합니다. (모든 세션 공용)"""
+    inline_tag = f"<style>{REPORT_CSS}</style>"
+    url = publish_static_asset("report", "css", REPORT_CSS)
+    tag = f'<link rel="stylesheet" href="{url}">' if url else inline_tag
+    _record_asset_payload("report_css", len(inline_tag.encode("utf-8")), len(tag.encode("utf-8")), url)
+    return tag
+
+def inject_report_css():
+    """리포트 화면에 CSS를 주입합니다."""
+    st.markdown(get_report_css_tag(), unsafe_allow_html=True)
+
+@st.cache_resource
+def get_hashtag_slider_asset(current_theme):
+    """
+    테마별 해시태그 슬라이더 HTML을 정적 파일로 한 번만 만들고 iframe 용 URL을 반환합니다. (실패 시 None)
+    st.iframe 은 '/' 로 시작하지 않는 문자열을 HTML 로 취급하므로, server.baseUrlPath 를 포함한 '/...' 경로로 돌려줍니다.
+    """
+    html_content = build_hashtag_slider_html(current_theme)
+    url = publish_static_asset(f"hashtag_slider.{current_theme or 'default'}", "html", html_content)
+    if url:
+        base_path = (st.get_option("server.baseUrlPath") or "").strip("/")
+        url = f"/{base_path}/{url}" if base_path else f"/{url}"
+    _record_asset_payload(f"hashtag_slider.{current_theme or 'default'}", len(html_content.encode("utf-8")),
+                          len(url.encode("utf-8")) if url else len(html_content.encode("utf-8")), url)
+    return url
+
+def show_report(store_data, data, competitor_index, peer_cube):
+    """상세 리포트 화면을 그립니다."""
     
-    </style>
-    """, unsafe_allow_html=True)
+    # [수정] UI/UX 개선을 위한 맞춤형 CSS (정적 파일 <link> 로 주입, 불가능하면 인라인 <style>)
+    inject_report_css()
 
     if st.button("⬅️ 다른 가게 검색하기"):
         st.session_state.selected_store = None
         st.session_state.ai_report_data = None
+        st.session_state.ai_report_stats = None
         st.rerun()
 
     st.title(f"💡 '{st.session_state.selected_store}' 경영 진단 리포트")
 
     full_desc_string = store_data.get('맞춤형설명', None)
     parsed_data = parse_full_description(full_desc_string)
+    competitors = find_nearby_competitors(competitor_index, store_data) # [추가] 주변 동종 업종 (tab1 패널, tab3 프롬프트 공용)
 
     tab1, tab2, tab3 = st.tabs(["🎯 AI 정밀 진단 (요약)", "📈 상세 데이터 (최근 3개월)", "🤖 AI 맞춤 전략 리포트"])
 
@@ -396,10 +1345,7 @@ def show_report(store_data, data):
 
         st.subheader("🚨 폐업 위험도 분석")
         risk_level_text = parsed_data['폐업 위험도']
-        css_class = "risk-default"
-        if "낮음" in risk_level_text: css_class = "risk-low"
-        elif "높음" in risk_level_text: css_class = "risk-high"
-        elif "중간" in risk_level_text or "보통" in risk_level_text: css_class = "risk-medium"
+        css_class = risk_css_class(risk_level_text)
         st.markdown(f"""
         <div class="risk-container">
             <div class="risk-level {css_class}">{risk_level_text}</div>
@@ -443,123 +1389,68 @@ def show_report(store_data, data):
         else: st.info("이 가게의 상권 정보 데이터를 찾을 수 없습니다.")
         st.divider()
 
+        # [추가] 같은 도로 / 인근 도로축 셀의 동종 업종 경쟁 현황
+        st.subheader("📍 주변 동종 업종 경쟁 현황")
+        if competitors is not None:
+            st.caption(f"기준 주소: {store_data.get('정규화주소')} · 인근 = 같은 기준 도로(`{store_data.get('기준도로')}`)에서 ±{NEARBY_CELL_RADIUS}칸(칸당 약 {ROAD_GRID_CELL_SIZE * 10}m)")
+            comp_col1, comp_col2 = st.columns(2)
+            for col, key, label in [(comp_col1, "same_road", f"같은 도로({store_data.get('도로명')})"), (comp_col2, "nearby", "인근 도로축")]:
+                rows = data.loc[competitors[key]]
+                operating = int(rows['폐업일'].isna().sum())
+                with col:
+                    st.markdown(f'<div class="metric-box box-color-1"><div class="metric-label">{label} 동종 업종</div><div class="metric-value">{len(rows)}개</div><div class="metric-trend">운영 중 {operating}개 · 폐업 {len(rows) - operating}개</div></div>', unsafe_allow_html=True)
+            nearby_rows = data.loc[competitors["nearby"]]
+            if not nearby_rows.empty:
+                with st.expander("인근 동종 업종 가게 목록 보기"):
+                    st.dataframe(
+                        nearby_rows[['가맹점명', '정규화주소', '개설일', '폐업일']].sort_values('정규화주소'),
+                        hide_index=True
+                    )
+        else:
+            st.info("도로명 주소 정보가 없어 주변 경쟁 현황을 계산할 수 없습니다.")
+        st.divider()
+
         st.subheader("📊 주요 지표 최신 동향 (vs 3개월 전)")
         metric_col1, metric_col2, metric_col3 = st.columns(3)
         with metric_col1:
             value = format_value(store_data.get('업종내매출순위비율_1m'), "%")
             trend = format_trend_with_arrows(store_data.get('업종내매출순위비율_추세'))
-            st.markdown(f'<div class="metric-box box-color-4"><div class="metric-label">업종 내 매출 순위</div><div class="metric-value">{value}</div><div class="metric-trend">{trend}</div></div>', unsafe_allow_html=True)
+            peer = format_peer_rank(peer_rank(peer_cube, store_data, '업종내매출순위비율_1m'))
+            st.markdown(f'<div class="metric-box box-color-4"><div class="metric-label">업종 내 매출 순위</div><div class="metric-value">{value}</div><div class="metric-trend">{trend}</div>{peer}</div>', unsafe_allow_html=True)
         with metric_col2:
             value = format_value(store_data.get('재방문율_1m'), "%")
             trend = format_trend_with_arrows(store_data.get('재방문율_추세'))
-            st.markdown(f'<div class="metric-box box-color-5"><div class="metric-label">재방문율</div><div class="metric-value">{value}</div><div class="metric-trend">{trend}</div></div>', unsafe_allow_html=True)
+            peer = format_peer_rank(peer_rank(peer_cube, store_data, '재방문율_1m'))
+            st.markdown(f'<div class="metric-box box-color-5"><div class="metric-label">재방문율</div><div class="metric-value">{value}</div><div class="metric-trend">{trend}</div>{peer}</div>', unsafe_allow_html=True)
         with metric_col3:
             value = format_value(store_data.get('신규고객비율_1m'), "%")
             trend = format_trend_with_arrows(store_data.get('신규고객비율_추세'))
-            st.markdown(f'<div class="metric-box box-color-6"><div class="metric-label">신규 고객 비율</div><div class="metric-value">{value}</div><div class="metric-trend">{trend}</div></div>', unsafe_allow_html=True)
+            peer = format_peer_rank(peer_rank(peer_cube, store_data, '신규고객비율_1m'))
+            st.markdown(f'<div class="metric-box box-color-6"><div class="metric-label">신규 고객 비율</div><div class="metric-value">{value}</div><div class="metric-trend">{trend}</div>{peer}</div>', unsafe_allow_html=True)
 
     with tab2:
         st.header("📈 상세 시계열 추이 분석 (최근 3개월)")
-        months = ['3개월 전', '2개월 전', '1개월 전']
-        x = range(len(months))
-
-        # --- 차트 크기/너비 설정 ---
-        CHART_FIGSIZE = (6, 3.5) 
-        CHART_WIDTH = 550        
-        # ---------------------------
 
-        st.subheader("고객 및 상권 동향")
-        # --- [유지] 3칸, 작은 간격 ---
-        chart_col1, chart_col2, chart_col3 = st.columns(3, gap="small") 
-        
-        with chart_col1:
-            data_list = [store_data.get(f'유동고객비율_{m}m') for m in [3,2,1]] + [store_data.get(f'직장고객비율_{m}m') for m in [3,2,1]] + [store_data.get(f'거주고객비율_{m}m') for m in [3,2,1]]
-            if pd.Series(data_list).notna().any():
-                fig, ax = plt.subplots(figsize=CHART_FIGSIZE) 
-                plot_line_chart(ax, months, [data_list[0:3], data_list[3:6], data_list[6:9]], ['유동고객', '직장고객', '거주고객'], "고객 유형 비율", ['steelblue', 'gray', 'darkgreen'], ['o', 's', '^'])
-                fig.tight_layout()
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png')
-                buf.seek(0)
-                img_data = base64.b64encode(buf.read()).decode()
-                # --- [유지] 왼쪽 정렬 ---
-                st.markdown(f"<img src='data:image/png;base64,{img_data}' width='{CHART_WIDTH}' class='zoom-chart'>", unsafe_allow_html=True)
-                plt.close(fig) 
-            else: st.info("고객 유형 비율 데이터가 없습니다.")
-
-        with chart_col2:
-            data_list = [store_data.get(f'신규고객비율_{m}m') for m in [3,2,1]] + [store_data.get(f'재방문율_{m}m') for m in [3,2,1]]
-            if pd.Series(data_list).notna().any():
-                fig, ax = plt.subplots(figsize=CHART_FIGSIZE) 
-                plot_line_chart(ax, months, [data_list[0:3], data_list[3:6]], ['신규고객', '재방문율'], "신규/재방문 고객", ['skyblue', 'salmon'], ['o', 's'])
-                fig.tight_layout()
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png')
-                buf.seek(0)
-                img_data = base64.b64encode(buf.read()).decode()
-                # --- [유지] 왼쪽 정렬 ---
-                st.markdown(f"<img src='data:image/png;base64,{img_data}' width='{CHART_WIDTH}' class='zoom-chart'>", unsafe_allow_html=True)
-                plt.close(fig) 
-            else: st.info("신규/재방문 고객 데이터가 없습니다.")
-
-        with chart_col3:
-            data_list = [store_data.get(f'상권내폐업비율_{m}m') for m in [3,2,1]] + [store_data.get(f'업종내폐업비율_{m}m') for m in [3,2,1]]
-            if pd.Series(data_list).notna().any():
-                fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
-                plot_line_chart(ax, months, [data_list[0:3], data_list[3:6]], ['상권내폐업', '업종내폐업'], "폐업 비율", ['gray', 'black'], ['o', 's'])
-                fig.tight_layout()
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png')
-                buf.seek(0)
-                img_data = base64.b64encode(buf.read()).decode()
-                # --- [유지] 왼쪽 정렬 ---
-                st.markdown(f"<img src='data:image/png;base64,{img_data}' width='{CHART_WIDTH}' class='zoom-chart'>", unsafe_allow_html=True)
-                plt.close(fig) 
-            else: st.info("폐업 비율 데이터가 없습니다.")
-            
-        st.divider()
-        st.subheader("매출 성과")
-        # --- [수정] 윗줄과 동일하게 st.columns(3)으로 변경 ---
-        chart_col4, chart_col5, _ = st.columns(3, gap="small") # 3번째 컬럼은 _ 로 받고 사용 안 함
-        
-        with chart_col4:
-            data_list = [store_data.get(f'상권내매출순위비율_{m}m') for m in [3,2,1]] + [store_data.get(f'업종내매출순위비율_{m}m') for m in [3,2,1]]
-            if pd.Series(data_list).notna().any():
-                fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
-                plot_bar_chart(ax, x, months, [data_list[0:3], data_list[3:6]], ['상권내', '업종내'], "매출 순위 비율 (상위 N%)", ['lightgray', 'steelblue'])
-                fig.tight_layout()
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png')
-                buf.seek(0)
-                img_data = base64.b64encode(buf.read()).decode()
-                # --- [유지] 왼쪽 정렬 ---
-                st.markdown(f"<img src='data:image/png;base64,{img_data}' width='{CHART_WIDTH}' class='zoom-chart'>", unsafe_allow_html=True)
-                plt.close(fig) 
-            else: st.info("매출 순위 비율 데이터가 없습니다.")
-            
-        with chart_col5:
-            data_list = [store_data.get(f'매출건수구간_{m}m') for m in [3,2,1]] + [store_data.get(f'매출금액구간_{m}m') for m in [3,2,1]]
-            if pd.Series(data_list).notna().any():
-                fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
-                plot_bar_chart(ax, x, months, [data_list[0:3], data_list[3:6]], ['건수', '금액'], "매출 건수/금액 (구간)", ['gray', 'darkgreen'])
-                fig.tight_layout()
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png')
-                buf.seek(0)
-                img_data = base64.b64encode(buf.read()).decode()
-                # --- [유지] 왼쪽 정렬 ---
-                st.markdown(f"<img src='data:image/png;base64,{img_data}' width='{CHART_WIDTH}' class='zoom-chart'>", unsafe_allow_html=True)
-                plt.close(fig) 
-            else: st.info("매출 건수/금액 데이터가 없습니다.")
+        for i, (section_title, specs) in enumerate(CHART_SECTIONS):
+            if i > 0:
+                st.divider()
+            st.subheader(section_title)
+            # --- [유지] 3칸, 작은 간격 (2개뿐인 줄도 같은 너비를 위해 3칸으로 나눔) ---
+            chart_cols = st.columns(3, gap="small")
+            for chart_col, spec in zip(chart_cols, specs):
+                with chart_col:
+                    png = render_chart_png(store_data, spec)
+                    if png is not None:
+                        # --- [유지] 왼쪽 정렬 ---
+                        st.markdown(chart_img_tag(png), unsafe_allow_html=True)
+                    else: st.info(f"{spec['empty']} 데이터가 없습니다.")
     
     with tab3:
         st.header("🤖 AI 비밀상담사의 맞춤 전략 리포트")
         st.markdown("위의 AI 정밀 진단과 상세 데이터를 바탕으로 AI가 사장님만을 위한 맞춤 전략을 제안합니다.")
         
-        def get_trend_str(col_name):
-            val = store_data.get(col_name)
-            return str(val) if not pd.isna(val) else "데이터 없음"
-        trend_analysis_text = "\n".join([f"- {col.replace('_', ' ')}: {get_trend_str(col)}" for col in store_data.index if '추세' in col])
+        # [수정] 추세 텍스트는 build_compact_prompt 안에서 압축('유지 유지' 지표는 한 줄로)하여 생성
+        trends = get_store_trends(store_data)
         
         # --- [수정] 프롬프트에 '상권 이름'과 '업종 현황'을 분리하여 전달 ---
         local_industry_info = "데이터 없음"
@@ -574,8 +1465,9 @@ def show_report(store_data, data):
             if not top_5_industries.empty:
                 local_industry_info = ", ".join([f"{index} ({value}개)" for index, value in top_5_industries.items()])
         # --- [수정] 여기까지 ---
+        nearby_competition_info = summarize_nearby_competitors(data, competitors)
 
-        prompt = generate_prompt(
+        prompt_args = dict(
             store_name=store_data.get('가맹점명'), industry=store_data.get('업종'),
             open_date=store_data.get('개설일'), close_date=store_data.get('폐업일'),
             closure_risk=parsed_data['폐업 위험도'], closure_factors=parsed_data['주요 원인'],
@@ -585,35 +1477,91 @@ def show_report(store_data, data):
             # [수정] 두 가지 정보를 분리해서 전달
             local_district_name=local_district_name, 
             local_industry_info=local_industry_info, 
+            nearby_competition_info=nearby_competition_info,
             
-            trend_analysis_text=trend_analysis_text
+            trends=trends
         )
+        # [추가] 같은 상권 × 업종 가게들이 함께 쓰는 AI 브리프 (유효한 것이 저장돼 있으면 API 호출 없이 바로 사용)
+        district_brief = load_district_brief(local_district_name, store_data.get('업종'))
+        if district_brief is not None and is_district_brief_stale(district_brief):
+            district_brief = None
+        try:
+            prompt, prompt_stats = build_compact_prompt(**prompt_args, district_brief=district_brief)
+        except ValueError as e:
+            st.error(f"프롬프트를 만들 수 없습니다: {e}")
+            return
 
         if st.button("🚀 AI 전략 리포트 생성하기"):
             my_bar = st.progress(0, text="AI 분석을 시작합니다. 잠시만 기다려주세요...")
             try:
-                for percent_complete in range(1, 81):
-                    time.sleep(0.02)
-                    text = "Gemini AI와 연결 중입니다..."
-                    if percent_complete > 40: text = "사장님의 데이터를 안전하게 전송하고 있습니다..."
-                    my_bar.progress(percent_complete, text=text)
+                # [수정] 진행바 연출용 인위적 대기(time.sleep)를 제거하고 실제 단계만 표시
+                my_bar.progress(20, text="Gemini AI와 연결 중입니다...")
                 my_secret_key = st.secrets["GOOGLE_API_KEY"]
-                genai.configure(api_key=my_secret_key)
-                model = genai.GenerativeModel('gemini-2.5-flash')
-                my_bar.progress(85, text="AI가 리포트를 생성하는 중입니다...")
-                response = model.generate_content(prompt)
-                my_bar.progress(95, text="AI의 답변을 분석하고 있습니다...")
-                cleaned_text = response.text.strip().replace("```json", "").replace("```", "")
-                report_data = json.loads(cleaned_text)
-                st.session_state.ai_report_data = report_data
+                model = get_gemini_model(my_secret_key)
+                brief_call_stats = None
+                if district_brief is None and has_district(local_district_name):
+                    # 이 상권 × 업종의 첫 리포트(또는 브리프 만료)일 때만 브리프를 만들어 저장 (시간/토큰은 리포트와 따로 기록)
+                    my_bar.progress(30, text=f"'{local_district_name}' 상권 브리프를 준비하는 중입니다...")
+                    district_brief, brief_call_stats = get_or_create_district_brief(my_secret_key, local_district_name, store_data.get('업종'), data)
+                    if district_brief is not None:
+                        prompt, prompt_stats = build_compact_prompt(**prompt_args, district_brief=district_brief)
+                started_at = time.perf_counter()
+                # 브리프가 있으면 지역 연계 제안은 브리프의 것을 쓰고, 나머지 항목만 요청 (출력 토큰 절감)
+                report_fields = BRIEFED_REPORT_FIELDS if district_brief is not None else None
+                my_bar.progress(40, text="AI가 리포트를 생성하는 중입니다...")
+                if report_fields is not None:
+                    response = model.generate_content(prompt, generation_config=report_generation_config(report_fields))
+                else:
+                    response = model.generate_content(prompt)
+                my_bar.progress(80, text="AI의 답변을 분석하고 있습니다...")
+
+                # [수정] 스키마 기준으로 해석하고, 깨진 응답에서도 온전한 항목은 살립니다.
+                report_data, missing_fields = parse_report_response(response.text, report_fields)
+                repair_responses = []
+                for _ in range(MAX_REPAIR_ATTEMPTS):
+                    if not report_data or not missing_fields:
+                        break
+                    my_bar.progress(90, text=f"누락된 항목({len(missing_fields)}개)만 다시 요청하고 있습니다...")
+                    report_data, missing_fields, repair_response = request_missing_fields(model, prompt, report_data, missing_fields, report_fields)
+                    repair_responses.append(repair_response)
+                if report_data and district_brief is not None:
+                    report_data["local_event_recommendation"] = district_brief["brief"]["local_event_recommendation"]
+                latency_sec = time.perf_counter() - started_at
+
+                # [추가] 지연시간 절감 비교: 켜져 있으면 같은 가게를 기존 방식으로도 호출해 측정
+                legacy_latency_sec, legacy_output_tokens = None, None
+                if LEGACY_LATENCY_BASELINE:
+                    my_bar.progress(95, text="비교용으로 기존 방식 응답 시간을 측정하고 있습니다...")
+                    legacy_latency_sec, legacy_usage = measure_legacy_latency(my_secret_key, build_legacy_prompt(**prompt_args))
+                    legacy_output_tokens = getattr(legacy_usage, "candidates_token_count", None)
+
+                # 실제 과금 토큰(usage_metadata)이 있으면 함께 기록 (누락 항목 재요청 포함)
+                usage_list = [getattr(r, "usage_metadata", None) for r in [response] + repair_responses]
+                st.session_state.ai_report_stats = {
+                    **prompt_stats,
+                    "latency_sec": latency_sec,
+                    "legacy_latency_sec": legacy_latency_sec,
+                    "legacy_output_tokens": legacy_output_tokens,
+                    # 본 호출 1회의 실제 입력 토큰 (시스템 지침 포함, 추정치와 비교용)
+                    "first_call_prompt_tokens": getattr(usage_list[0], "prompt_token_count", None),
+                    "prompt_tokens": sum(getattr(u, "prompt_token_count", 0) or 0 for u in usage_list) if any(usage_list) else None,
+                    "output_tokens": sum(getattr(u, "candidates_token_count", 0) or 0 for u in usage_list) if any(usage_list) else None,
+                    "repair_calls": len(repair_responses),
+                    "missing_fields": missing_fields,
+                    "brief_call": brief_call_stats,
+                }
+
                 my_bar.progress(100, text="분석 완료!")
-                time.sleep(1)
-                my_bar.empty()
-            except json.JSONDecodeError:
                 my_bar.empty()
-                st.error("AI가 JSON 형식으로 응답하지 않았습니다. 원본 응답을 표시합니다.")
-                if 'response' in locals(): st.markdown(response.text)
-                st.session_state.ai_report_data = None
+                if report_data:
+                    st.session_state.ai_report_data = report_data
+                    save_ai_report(store_data.get('가맹점ID'), report_data)
+                    if missing_fields:
+                        st.warning(f"AI 응답에서 일부 항목을 받지 못했습니다: {', '.join(missing_fields)}")
+                else:
+                    st.error("AI가 JSON 형식으로 응답하지 않았습니다. 원본 응답을 표시합니다.")
+                    st.markdown(response.text)
+                    st.session_state.ai_report_data = None
             except Exception as e:
                 my_bar.empty()
                 st.error(f"AI 리포트 생성 중 오류 발생: {e}")
@@ -639,6 +1587,9 @@ def show_report(store_data, data):
                     source = event_rec.get("source")
                     if source and "http" in source:
                         st.caption(f"정보 출처: [{source}]({source})\n\n(참고: 위 출처는 AI가 생성한 예시 URL일 수 있으며, 실제 접속이 어려울 수 있습니다.)")
+                    brief_id = (st.session_state.get("ai_report_stats") or {}).get("district_brief_id")
+                    if brief_id:
+                        st.caption(f"상권 브리프 {brief_id} 기준 제안입니다. (같은 상권·업종 가게에 공통 적용)")
                 else:
                     st.info("현재 추천할만한 주변 지역 행사를 찾지 못했습니다.")
 
@@ -654,29 +1605,65 @@ def show_report(store_data, data):
                 st.markdown("---")
                 st.write(f"**AI 상담사의 응원 메시지:** {report_data.get('encouragement', '')}")
 
+            # [추가] 요청별 토큰/지연시간 절감 리포트
+            stats = st.session_state.get("ai_report_stats")
+            if stats:
+                saved_ratio = stats["saved_tokens_est"] / stats["legacy_tokens_est"] * 100 if stats["legacy_tokens_est"] else 0
+                billed = f", 실제 입력 {stats['prompt_tokens']}토큰" if stats.get("prompt_tokens") is not None else ""
+                if stats.get("repair_calls"):
+                    billed += f", 누락 항목 재요청 {stats['repair_calls']}회 포함"
+                if stats.get("legacy_latency_sec") is not None:
+                    latency_text = (
+                        f"응답 시간 {stats['legacy_latency_sec']:.1f}초 → {stats['latency_sec']:.1f}초 "
+                        f"({stats['legacy_latency_sec'] - stats['latency_sec']:.1f}초 절감, 기존 방식 실측)"
+                    )
+                else:
+                    latency_text = f"응답 시간 {stats['latency_sec']:.1f}초 (기존 방식 비교는 LEGACY_LATENCY_BASELINE=1 일 때 측정)"
+                brief_call = stats.get("brief_call")
+                if brief_call:
+                    brief_tokens = (
+                        f", 입력 {brief_call['prompt_tokens']}토큰 · 출력 {brief_call['output_tokens']}토큰"
+                        if brief_call.get("prompt_tokens") is not None else ""
+                    )
+                    brief_result = "생성" if brief_call["generated"] else "생성 실패"
+                    if brief_call["generated"] and not brief_call["saved"]:
+                        brief_result += ", 저장 실패"
+                    latency_text += f" · 상권 브리프 별도 호출 {brief_call['latency_sec']:.1f}초 ({brief_result}{brief_tokens})"
+                st.caption(
+                    f"⚡ 입력 토큰 약 {stats['legacy_tokens_est']} → {stats['prompt_tokens_est'] + stats['system_tokens_est']} "
+                    f"({stats['saved_tokens_est']}토큰, {saved_ratio:.0f}% 절감{billed}) · "
+                    f"{latency_text} · 예산 {stats['budget']}토큰 (압축 단계 {stats['compaction_level']})"
+                )
+
         with st.expander("AI에게 전달된 프롬MPT 내용 보기 (디버깅용)"):
             st.text_area("프롬프트 내용", prompt, height=300, disabled=True)
+            st.text_area("공통 시스템 지침 (모델에 1회 등록, 매 호출 입력 토큰으로 과금)", SYSTEM_INSTRUCTION, height=200, disabled=True)
+            # [추가] 추정치(estimate_tokens)를 확인할 수 있도록 마지막 호출의 실제 입력 토큰(usage_metadata)을 함께 표시
+            last_stats = st.session_state.get("ai_report_stats") or {}
+            actual_text = ""
+            if last_stats.get("first_call_prompt_tokens") is not None:
+                actual_text = (
+                    f" · 마지막 호출 입력 토큰: 추정 {last_stats['prompt_tokens_est'] + last_stats['system_tokens_est']} / "
+                    f"실제 {last_stats['first_call_prompt_tokens']} (usage_metadata)"
+                )
+            st.caption(
+                f"입력 토큰 약 {prompt_stats['prompt_tokens_est'] + prompt_stats['system_tokens_est']} "
+                f"(가게별 {prompt_stats['prompt_tokens_est']} + 시스템 지침 {prompt_stats['system_tokens_est']}) / 예산 {prompt_stats['budget']}토큰"
+                + (f" (⚠️ 예산 초과로 끝에서 {prompt_stats['truncated_lines']}줄 생략)" if prompt_stats["truncated_lines"] else "")
+                + actual_text
+            )
 
-def show_homepage(display_list, display_to_original_map):
-    """앱의 메인 화면(검색 페이지)을 그립니다."""
-    st.markdown("<h1 style='text-align: center; color: var(--primary-color);'>💡 내 가게를 살리는 AI 비밀상담사</h1>", unsafe_allow_html=True)
-    
-    # 1. [수정] st.markdown 소제목을 삭제합니다. (HTML 안으로 이동)
-    # st.markdown("<h3 style='text-align: center; color: var(--gray-70); margin-bottom: 0px;'>▼ 요즘 뜨는 키워드 ▼</h3>", unsafe_allow_html=True)
+# 여기에 표시할 해시태그를 원하는 대로 수정하세요.
+HASHTAGS = [
+    "#성동구핫플",
+    "#서울숲데이트",
+    "#뚝섬맛집",
+    "#성수동카페거리",
+    "#요즘뜨는전시"
+]
 
-    # 2. 여기에 표시할 해시태그를 원하는 대로 수정하세요.
-    hashtags = [
-        "#성동구핫플",
-        "#서울숲데이트",
-        "#뚝섬맛집",
-        "#성수동카페거리",
-        "#요즘뜨는전시"
-    ]
-    
-    # 3. 현재 Streamlit 테마('light' 또는 'dark')를 가져옵니다.
-    current_theme = st.get_option("theme.base")
-
-    # 4. components.html에 들어갈 내용
+def build_hashtag_slider_html(current_theme):
+    """홈 화면 '요즘 뜨는 키워드' 슬라이더의 전체 HTML 문서를 만듭니다."""
     html_content = f"""
     <html>
     <head>
@@ -745,7 +1732,7 @@ def show_homepage(display_list, display_to_original_map):
                 if (!container) {{ setTimeout(startHashtagSlider, 300); return; }}
                 
                 window.hashtagSliderInitialized = true; 
-                const tags = {json.dumps(hashtags)};
+                const tags = {json.dumps(HASHTAGS)};
                 let currentIndex = 0;
 
                 tags.forEach((tag, index) => {{
@@ -770,9 +1757,26 @@ def show_homepage(display_list, display_to_original_map):
     </body>
     </html>
     """
+    return html_content
+
+def show_homepage(display_list, display_to_original_map):
+    """앱의 메인 화면(검색 페이지)을 그립니다."""
+    st.markdown("<h1 style='text-align: center; color: var(--primary-color);'>💡 내 가게를 살리는 AI 비밀상담사</h1>", unsafe_allow_html=True)
     
+    # 1. [수정] st.markdown 소제목을 삭제합니다. (HTML 안으로 이동)
+    # st.markdown("<h3 style='text-align: center; color: var(--gray-70); margin-bottom: 0px;'>▼ 요즘 뜨는 키워드 ▼</h3>", unsafe_allow_html=True)
+
+    # 2. [수정] 해시태그 목록과 슬라이더 HTML은 HASHTAGS / build_hashtag_slider_html 로 이동 (테마별 1회 생성 후 정적 파일로 제공)
+    # 3. 현재 Streamlit 테마('light' 또는 'dark')를 가져옵니다.
+    current_theme = st.get_option("theme.base")
+    slider_url = get_hashtag_slider_asset(current_theme)
+
     # 5. [수정] height를 100px로 넉넉하게 확보
-    components.html(html_content, height=100)
+    # [수정] 제거 예정인 st.components.v1.iframe/html 대신 st.iframe 사용
+    if slider_url:
+        st.iframe(slider_url, height=100) # 매 실행마다 URL만 전송
+    else:
+        st.iframe(build_hashtag_slider_html(current_theme), height=100) # HTML 문자열은 그대로 임베드
     
     st.markdown("---") # 구분선
 
@@ -805,6 +1809,7 @@ def main():
     if 'selected_store' not in st.session_state:
         st.session_state.selected_store = None
         st.session_state.ai_report_data = None
+        st.session_state.ai_report_stats = None
 
     data, display_list, display_to_original_map = load_data("최종데이터.csv")
     if data is None:
@@ -812,10 +1817,15 @@ def main():
 
     if st.session_state.selected_store is None:
         show_homepage(display_list, display_to_original_map)
+        # [추가] 첫 화면을 그린 뒤에 시작 시간을 기록하고, 차트/AI 라이브러리를 백그라운드에서 미리 불러옴
+        record_first_homepage_render()
+        start_background_warmup()
     else:
         try:
             store_data_row = data[data['가맹점명'] == st.session_state.selected_store].iloc[0]
-            show_report(store_data_row, data)
+            competitor_index = build_competitor_index(data, "최종데이터.csv")
+            peer_cube = load_percentile_cube(data, "최종데이터.csv")
+            show_report(store_data_row, data, competitor_index, peer_cube)
         except (IndexError, KeyError) as e:
             st.error("선택한 가게 정보를 찾는 데 실패했습니다. 다시 검색해주세요.")
             st.session_state.selected_store = None
@@ -0,0 +1,364 @@
+"""
+경영 진단 리포트 일괄 내보내기 (정적 HTML / PDF)
+
+앱(show_report)을 한 가게씩 클릭하지 않고, 여러 가맹점의 리포트(요약 진단 + 상세 차트 + 저장된 AI 리포트)를
+자체 완결형 HTML 또는 PDF 파일로 한 번에 만듭니다. 가게별 렌더링은 프로세스 풀로 나누어 처리합니다.
+
+사용 예:
+    python export_reports.py --ids 7E27181707 FE30B6645E
+    python export_reports.py --district 성수 --format html pdf --workers 8 --zip
+    python export_reports.py --all
+"""
+import argparse
+import hashlib
+import html
+import inspect
+import io
+import json
+import os
+import tempfile
+import textwrap
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg") # 워커 프로세스가 GUI 백엔드를 고르지 않도록 하위 모듈보다 먼저 지정
+import matplotlib.image as mpimg
+from matplotlib.backends.backend_pdf import PdfPages
+import pandas as pd
+
+import app
+
+plt = app.get_pyplot() # 앱과 같은 한글 폰트 설정을 사용
+
+DATA_FILEPATH = "최종데이터.csv"
+
+# Streamlit 테마 변수가 없는 정적 HTML 에서 REPORT_CSS 를 그대로 쓰기 위한 기본값 (라이트 테마)
+STATIC_THEME_CSS = """
+:root {
+    --background-color: #ffffff; --secondary-background-color: #f0f2f6; --text-color: #31333f;
+    --gray-20: #e6eaf1; --gray-30: #d5dae5; --gray-70: #555867; --primary-color: #ff4b4b;
+}
+body { font-family: "NanumGothic", -apple-system, "Segoe UI", sans-serif; color: var(--text-color); max-width: 1200px; margin: 0 auto; padding: 24px; }
+.row { display: flex; gap: 16px; margin-bottom: 16px; }
+.row > * { flex: 1; }
+.charts { display: flex; flex-wrap: wrap; gap: 8px; }
+.charts img { max-width: 100%; }
+.ai-box { border-radius: 8px; padding: 12px 16px; margin: 8px 0; background: var(--secondary-background-color); }
+.ai-risk { background: #fff1f0; } .ai-opportunity { background: #f6ffed; } .ai-example { background: #fffbe6; }
+table.action-table { border-collapse: collapse; width: 100%; }
+table.action-table th, table.action-table td { border: 1px solid var(--gray-30); padding: 6px 10px; text-align: left; }
+hr { border: none; border-top: 1px solid var(--gray-30); margin: 24px 0; }
+"""
+
+# 워커 프로세스별 전역 상태 (initializer 에서 한 번만 준비)
+_DATA = None
+_COMPETITOR_INDEX = None
+_PEER_CUBE = None
+_CHART_CACHE_DIR = None
+
+
+def _init_worker(chart_cache_dir):
+    """워커 프로세스마다 데이터와 인덱스/백분위 큐브를 한 번만 불러옵니다."""
+    global _DATA, _COMPETITOR_INDEX, _PEER_CUBE, _CHART_CACHE_DIR
+    _DATA = app.load_data(DATA_FILEPATH)[0]
+    _COMPETITOR_INDEX = app.build_competitor_index(_DATA, DATA_FILEPATH)
+    _PEER_CUBE = app.load_percentile_cube(_DATA, DATA_FILEPATH)
+    _CHART_CACHE_DIR = chart_cache_dir
+
+
+# ----------------------------------------------------------------------
+# 1. 차트 캐시 (워커 간 공유)
+# ----------------------------------------------------------------------
+# 그림 모양에 영향을 주는 공통 설정 (크기·x축·폰트·해상도·그리기 함수 코드). 바뀌면 캐시 키가 달라져 PNG 를 다시 그립니다.
+CHART_SETTINGS_KEY = json.dumps([
+    app.CHART_FIGSIZE, app.CHART_MONTHS,
+    [plt.rcParams[k] for k in ("font.family", "axes.unicode_minus", "figure.dpi", "savefig.dpi")],
+    matplotlib.__version__,
+    [inspect.getsource(f) for f in (app.render_chart_png, app.plot_line_chart, app.plot_bar_chart)],
+], ensure_ascii=False, default=str)
+
+
+def cached_chart_png(store_data, spec):
+    """
+    차트 정의(spec 전체) + 그림 설정 + 3개월 데이터가 같으면 이미 그린 PNG 를 재사용합니다.
+    캐시는 디스크 디렉터리라서 모든 워커 프로세스가 함께 씁니다.
+    """
+    series = app.chart_series(store_data, spec)
+    key_source = json.dumps([
+        CHART_SETTINGS_KEY, spec,
+        [[None if pd.isna(v) else float(v) for v in values] for values in series],
+    ], ensure_ascii=False, sort_keys=True, default=str)
+    path = os.path.join(_CHART_CACHE_DIR, hashlib.md5(key_source.encode("utf-8")).hexdigest() + ".png")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    png = app.render_chart_png(store_data, spec, series=series)
+    if png is not None:
+        # 다른 워커가 같은 파일을 읽는 중일 수 있으므로 임시 파일에 쓴 뒤 교체합니다.
+        fd, tmp_path = tempfile.mkstemp(dir=_CHART_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+    return png
+
+
+# ----------------------------------------------------------------------
+# 2. HTML 렌더링
+# ----------------------------------------------------------------------
+def _esc(value, default="데이터 없음"):
+    return html.escape(default if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value))
+
+
+def markdown_table_to_html(markdown):
+    """AI 리포트의 마크다운 테이블(action_table)을 HTML 테이블로 변환합니다."""
+    rows = [line.strip().strip("|").split("|") for line in markdown.strip().splitlines() if line.strip().startswith("|")]
+    rows = [[cell.strip() for cell in row] for row in rows if not all(set(cell.strip()) <= set("-: ") for cell in row)]
+    if not rows:
+        return f"<p>{_esc(markdown)}</p>"
+    header = "".join(f"<th>{_esc(cell)}</th>" for cell in rows[0])
+    body = "".join("<tr>" + "".join(f"<td>{_esc(cell)}</td>" for cell in row) + "</tr>" for row in rows[1:])
+    return f"<table class='action-table'><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def summary_html(store_data, parsed_data):
+    """tab1(AI 정밀 진단 요약) 내용을 HTML 로 만듭니다."""
+    risk_level_text = parsed_data['폐업 위험도']
+    parts = [
+        f"<h2>🎯 AI 정밀 진단 요약</h2><p><b>{_esc(store_data.get('업종'), '업종정보 없음')}</b> 업종을 운영 중인 사장님 가게의 핵심 진단 결과입니다.</p>",
+        "<h3>🚨 폐업 위험도 분석</h3>",
+        f"<div class='risk-container'><div class='risk-level {app.risk_css_class(risk_level_text)}'>{_esc(risk_level_text)}</div>"
+        f"<div class='risk-factors'><strong>주요 원인:</strong><br>{_esc(parsed_data['주요 원인'])}</div></div>",
+        "<h3>🧬 3차원 정밀 진단</h3><div class='row'>",
+    ]
+    for i, (label, key) in enumerate([("① 고객 유형", "고객유형"), ("② 가게 경쟁력", "경쟁력"), ("③ 고객 관계", "고객관계")], start=1):
+        parts.append(f"<div class='metric-box box-color-{i}'><div class='metric-label'>{label}</div><div class='metric-value'>{_esc(parsed_data[key])}</div></div>")
+    parts.append("</div>")
+
+    district = store_data.get('상권')
+    parts.append("<h3>🏘️ 우리 상권 현황</h3>")
+    if not pd.isna(district):
+        top_5_industries = _DATA[_DATA['상권'] == district]['업종'].value_counts().nlargest(5)
+        max_value = top_5_industries.max() if not top_5_industries.empty else 0
+        parts.append(f"<p><b>'{_esc(district)}' 상권의 주요 업종 Top 5</b></p><div class='bar-chart-container'>")
+        for index, value in top_5_industries.items():
+            width = (value / max_value) * 100 if max_value > 0 else 0
+            parts.append(f"<div class='bar-chart-row'><div class='bar-chart-label'>{_esc(index)} ({value}개)</div>"
+                         f"<div class='bar-chart-bar-container'><div class='bar-chart-bar' style='width: {width}%;'></div></div></div>")
+        parts.append("</div>")
+    else:
+        parts.append("<p>이 가게의 상권 정보 데이터를 찾을 수 없습니다.</p>")
+
+    competitors = app.find_nearby_competitors(_COMPETITOR_INDEX, store_data)
+    parts.append(f"<h3>📍 주변 동종 업종 경쟁 현황</h3><p>{_esc(app.summarize_nearby_competitors(_DATA, competitors))}</p>")
+
+    parts.append("<h3>📊 주요 지표 최신 동향 (vs 3개월 전)</h3><div class='row'>")
+    for box, (label, metric) in enumerate([("업종 내 매출 순위", "업종내매출순위비율"), ("재방문율", "재방문율"), ("신규 고객 비율", "신규고객비율")], start=4):
+        value = app.format_value(store_data.get(f'{metric}_1m'), "%")
+        trend = app.format_trend_with_arrows(store_data.get(f'{metric}_추세'))
+        peer = app.format_peer_rank(app.peer_rank(_PEER_CUBE, store_data, f'{metric}_1m'))
+        parts.append(f"<div class='metric-box box-color-{box}'><div class='metric-label'>{label}</div><div class='metric-value'>{value}</div><div class='metric-trend'>{trend}</div>{peer}</div>")
+    parts.append("</div>")
+    return "\n".join(parts)
+
+
+def charts_html(store_data):
+    """tab2(상세 데이터) 차트를 인라인 이미지로 만듭니다."""
+    parts = ["<h2>📈 상세 시계열 추이 분석 (최근 3개월)</h2>"]
+    for section_title, specs in app.CHART_SECTIONS:
+        parts.append(f"<h3>{section_title}</h3><div class='charts'>")
+        for spec in specs:
+            png = cached_chart_png(store_data, spec)
+            parts.append(app.chart_img_tag(png) if png is not None else f"<p>{spec['empty']} 데이터가 없습니다.</p>")
+        parts.append("</div>")
+    return "\n".join(parts)
+
+
+def ai_report_html(report):
+    """저장된 AI 리포트(tab3)를 HTML 로 만듭니다."""
+    if not report:
+        return "<h2>🤖 AI 맞춤 전략 리포트</h2><p>저장된 AI 리포트가 없습니다. 앱에서 리포트를 생성한 뒤 다시 내보내주세요.</p>"
+    event_rec = report.get("local_event_recommendation") or {}
+    parts = [
+        "<h2>🤖 AI 맞춤 전략 리포트</h2>",
+        f"<h3>💬 사장님 가게 요약</h3><div class='ai-box'>{_esc(report.get('store_summary'), '요약 정보 없음')}</div>",
+        f"<h3>🚦 위험 및 기회 신호</h3><div class='ai-box ai-risk'>{_esc(report.get('risk_signal'), '위험 신호 없음')}</div>"
+        f"<div class='ai-box ai-opportunity'>{_esc(report.get('opportunity_signal'), '기회 신호 없음')}</div>",
+        f"<h3>{_esc(report.get('action_plan_title'), '핵심 액션 플랜')}</h3><p>{_esc(report.get('action_plan_detail'), '')}</p>",
+        "<h3>💡 지역 연계 마케팅 제안</h3>",
+        f"<div class='ai-box ai-opportunity'><b>{_esc(event_rec.get('title'))}</b><br>{_esc(event_rec.get('details'), '')}</div>"
+        if event_rec.get("title") else "<p>현재 추천할만한 주변 지역 행사를 찾지 못했습니다.</p>",
+        f"<h3>📚 참고: 유사 전략 성공 사례</h3><div class='ai-box ai-example'>💡 {_esc(report.get('fact_based_example'), '관련 사례 없음')}</div>",
+        markdown_table_to_html(report.get("action_table") or "실행 계획 없음"),
+        f"<h3>📈 예상 기대효과</h3><div class='ai-box ai-opportunity'><b>목표:</b> {_esc(report.get('expected_effect'))}</div>",
+        f"<hr><p><b>AI 상담사의 응원 메시지:</b> {_esc(report.get('encouragement'), '')}</p>",
+    ]
+    return "\n".join(parts)
+
+
+def build_store_html(store_data):
+    """가게 1곳의 자체 완결형 리포트 HTML 문서를 만듭니다. (CSS, 차트 이미지 모두 인라인)"""
+    parsed_data = app.parse_full_description(store_data.get('맞춤형설명'))
+    report = app.load_cached_ai_report(store_data.get('가맹점ID'))
+    title = f"💡 '{_esc(store_data.get('가맹점명'))}' 경영 진단 리포트"
+    return f"""<!DOCTYPE html>
+<html lang="ko">
+<head><meta charset="utf-8"><title>{title}</title>
+<style>{STATIC_THEME_CSS}{app.REPORT_CSS}</style></head>
+<body>
+<h1>{title}</h1>
+<p>가맹점ID: {_esc(store_data.get('가맹점ID'))} · 주소: {_esc(store_data.get('정규화주소') if not pd.isna(store_data.get('정규화주소')) else store_data.get('주소'))}</p>
+{summary_html(store_data, parsed_data)}
+<hr>
+{charts_html(store_data)}
+<hr>
+{ai_report_html(report)}
+</body>
+</html>"""
+
+
+# ----------------------------------------------------------------------
+# 3. PDF 렌더링 (matplotlib 만 사용)
+# ----------------------------------------------------------------------
+PDF_PAGE_SIZE = (8.27, 11.69) # A4 (inch)
+
+def _text_page(pdf, title, lines):
+    """제목과 줄 목록을 A4 한 페이지(넘치면 여러 페이지)에 씁니다."""
+    wrapped = []
+    for line in lines:
+        wrapped.extend(textwrap.wrap(line, width=48) or [""])
+    per_page = 50
+    for start in range(0, max(len(wrapped), 1), per_page):
+        fig = plt.figure(figsize=PDF_PAGE_SIZE)
+        fig.text(0.07, 0.95, title, fontsize=15, weight="bold", va="top")
+        fig.text(0.07, 0.91, "\n".join(wrapped[start:start + per_page]), fontsize=10, va="top", linespacing=1.6)
+        pdf.savefig(fig)
+        plt.close(fig)
+
+
+def write_store_pdf(store_data, path):
+    """가게 1곳의 리포트를 요약 → 차트 → AI 리포트 순서의 PDF 로 저장합니다."""
+    parsed_data = app.parse_full_description(store_data.get('맞춤형설명'))
+    competitors = app.find_nearby_competitors(_COMPETITOR_INDEX, store_data)
+    report = app.load_cached_ai_report(store_data.get('가맹점ID'))
+
+    summary = [
+        f"업종: {store_data.get('업종')} · 상권: {store_data.get('상권')}",
+        f"폐업 위험도: {parsed_data['폐업 위험도']}",
+        f"주요 원인: {parsed_data['주요 원인']}",
+        f"고객 유형: {parsed_data['고객유형']}",
+        f"가게 경쟁력: {parsed_data['경쟁력']}",
+        f"고객 관계: {parsed_data['고객관계']}",
+        f"주변 동종 업종: {app.summarize_nearby_competitors(_DATA, competitors)}",
+        "",
+    ]
+    for label, metric in [("업종 내 매출 순위", "업종내매출순위비율"), ("재방문율", "재방문율"), ("신규 고객 비율", "신규고객비율")]:
+        rank = app.peer_rank(_PEER_CUBE, store_data, f'{metric}_1m')
+        peer = f" ({rank[1]} {rank[2]}곳 중 상위 {rank[0]}%)" if rank else ""
+        summary.append(f"{label}: {app.format_value(store_data.get(f'{metric}_1m'), '%')} · 추세 {store_data.get(f'{metric}_추세')}{peer}")
+
+    with PdfPages(path) as pdf:
+        _text_page(pdf, f"'{store_data.get('가맹점명')}' 경영 진단 리포트", summary)
+
+        pngs = [png for _, specs in app.CHART_SECTIONS for spec in specs if (png := cached_chart_png(store_data, spec)) is not None]
+        if pngs:
+            fig, axes = plt.subplots(3, 2, figsize=PDF_PAGE_SIZE)
+            for ax in axes.flat:
+                ax.axis("off")
+            for ax, png in zip(axes.flat, pngs):
+                ax.imshow(mpimg.imread(io.BytesIO(png), format="png"))
+            fig.suptitle("상세 시계열 추이 분석 (최근 3개월)", fontsize=14)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+        if report:
+            event_rec = report.get("local_event_recommendation") or {}
+            _text_page(pdf, "AI 맞춤 전략 리포트", [
+                f"[가게 요약] {report.get('store_summary', '')}",
+                f"[위험 신호] {report.get('risk_signal', '')}",
+                f"[기회 신호] {report.get('opportunity_signal', '')}",
+                f"[{report.get('action_plan_title', '핵심 액션 플랜')}] {report.get('action_plan_detail', '')}",
+                f"[지역 연계 마케팅] {event_rec.get('title', '')} - {event_rec.get('details', '')}",
+                f"[유사 사례] {report.get('fact_based_example', '')}",
+                *(report.get("action_table") or "").splitlines(),
+                f"[예상 기대효과] {report.get('expected_effect', '')}",
+                f"[응원 메시지] {report.get('encouragement', '')}",
+            ])
+
+
+# ----------------------------------------------------------------------
+# 4. 일괄 실행
+# ----------------------------------------------------------------------
+def export_store(task):
+    """(행 인덱스, 출력 폴더, 형식 목록)을 받아 가게 1곳의 파일을 만들고 경로 목록을 반환합니다."""
+    row_label, out_dir, formats = task
+    store_data = _DATA.loc[row_label]
+    base = os.path.join(out_dir, f"{store_data.get('가맹점ID')}")
+    paths = []
+    if "html" in formats:
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(build_store_html(store_data))
+        paths.append(base + ".html")
+    if "pdf" in formats:
+        write_store_pdf(store_data, base + ".pdf")
+        paths.append(base + ".pdf")
+    return paths
+
+
+def select_stores(data, ids=None, district=None, export_all=False):
+    """가맹점ID 목록 / 상권 / 전체 중 하나로 내보낼 가게의 행 인덱스를 고릅니다."""
+    if export_all:
+        return list(data.index)
+    if district:
+        return list(data.index[data['상권'] == district])
+    return list(data.index[data['가맹점ID'].isin(ids or [])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="경영 진단 리포트를 정적 HTML/PDF 로 일괄 내보냅니다.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--ids", nargs="+", help="내보낼 가맹점ID 목록")
+    target.add_argument("--district", help="내보낼 상권 이름 (예: 성수)")
+    target.add_argument("--all", action="store_true", help="전체 가게 내보내기")
+    parser.add_argument("--format", nargs="+", choices=["html", "pdf"], default=["html"], help="출력 형식 (기본: html)")
+    parser.add_argument("--out", default="exports", help="출력 폴더 (기본: exports)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="프로세스 수 (기본: CPU 수)")
+    parser.add_argument("--zip", action="store_true", help="결과를 <출력 폴더>.zip 으로 압축")
+    args = parser.parse_args()
+
+    data = app.load_data(DATA_FILEPATH)[0]
+    if data is None:
+        raise SystemExit(f"'{DATA_FILEPATH}' 데이터를 불러오지 못했습니다.")
+    rows = select_stores(data, args.ids, args.district, args.all)
+    if not rows:
+        raise SystemExit("조건에 맞는 가게가 없습니다.")
+
+    # 백분위 큐브 파일을 워커들보다 먼저 만들어 두어, 워커는 저장된 큐브를 불러오기만 하게 합니다.
+    app.load_percentile_cube(data, DATA_FILEPATH)
+    chart_cache_dir = os.path.join(args.out, ".chart_cache")
+    os.makedirs(chart_cache_dir, exist_ok=True)
+
+    started_at = time.perf_counter()
+    tasks = [(row, args.out, args.format) for row in rows]
+    chunksize = max(1, len(tasks) // (args.workers * 4))
+    outputs = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(chart_cache_dir,)) as executor:
+        for i, paths in enumerate(executor.map(export_store, tasks, chunksize=chunksize), start=1):
+            outputs.extend(paths)
+            if i % 100 == 0 or i == len(tasks):
+                print(f"[{i}/{len(tasks)}] {time.perf_counter() - started_at:.1f}초")
+
+    if args.zip:
+        zip_path = f"{args.out.rstrip(os.sep)}.zip"
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            for path in outputs:
+                zf.write(path, arcname=os.path.relpath(path, args.out))
+        print(f"압축 파일: {zip_path} ({os.path.getsize(zip_path) / 1024:.0f}KB)")
+
+    print(f"완료: 가게 {len(rows)}곳, 파일 {len(outputs)}개, {time.perf_counter() - started_at:.1f}초 → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
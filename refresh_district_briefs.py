@@ -0,0 +1,87 @@
+"""
+상권 × 업종 AI 브리프 일괄 생성/갱신
+
+앱은 브리프가 없을 때 그 상권·업종의 첫 리포트를 만들면서 브리프를 생성합니다.
+이 스크립트는 만료(유효 기간 경과 또는 버전 변경)된 브리프를 미리 다시 만들어 두는 용도로, cron 등에서 정기 실행합니다.
+API 키는 환경변수 GOOGLE_API_KEY, 없으면 .streamlit/secrets.toml 의 GOOGLE_API_KEY 를 사용합니다.
+유효 기간은 앱과 같은 환경변수 DISTRICT_BRIEF_MAX_AGE_DAYS (기본 30일) 로 정합니다.
+저장까지 실패한 브리프가 하나라도 있으면 종료 코드 1 로 끝납니다.
+
+사용 예:
+    python refresh_district_briefs.py                      # 만료된 브리프만 갱신
+    python refresh_district_briefs.py --district 성수 --force
+    DISTRICT_BRIEF_MAX_AGE_DAYS=7 python refresh_district_briefs.py --dry-run
+"""
+import argparse
+import os
+import time
+
+import app
+
+DATA_FILEPATH = "최종데이터.csv"
+
+
+def select_groups(data, district=None, min_stores=1):
+    """브리프 대상 (상권, 업종, 가게 수) 목록을 가게 수가 많은 순으로 고릅니다."""
+    counts = data.groupby(['상권', '업종']).size().sort_values(ascending=False)
+    groups = []
+    for (group_district, industry), count in counts.items():
+        if not app.has_district(group_district) or count < min_stores:
+            continue
+        if district and group_district != district:
+            continue
+        groups.append((group_district, industry, int(count)))
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="상권 × 업종 AI 브리프를 생성/갱신합니다.")
+    parser.add_argument("--district", help="이 상권의 브리프만 갱신 (예: 성수)")
+    parser.add_argument("--min-stores", type=int, default=1, help="가게 수가 이보다 적은 그룹은 건너뜀 (기본: 1)")
+    parser.add_argument("--force", action="store_true", help="유효한 브리프도 모두 다시 생성")
+    parser.add_argument("--dry-run", action="store_true", help="갱신 대상만 출력하고 API 는 호출하지 않음")
+    args = parser.parse_args()
+
+    data = app.load_data(DATA_FILEPATH)[0]
+    if data is None:
+        raise SystemExit(f"'{DATA_FILEPATH}' 데이터를 불러오지 못했습니다.")
+    groups = select_groups(data, args.district, args.min_stores)
+    if not groups:
+        raise SystemExit("조건에 맞는 상권 × 업종 그룹이 없습니다.")
+
+    targets = []
+    for district, industry, count in groups:
+        record = app.load_district_brief(district, industry)
+        if args.force or record is None or app.is_district_brief_stale(record):
+            targets.append((district, industry, count))
+    print(f"그룹 {len(groups)}개 중 갱신 대상 {len(targets)}개 (대상 가게 {sum(t[2] for t in targets)}곳, "
+          f"유효 기간 {app.DISTRICT_BRIEF_MAX_AGE_DAYS}일)")
+    if args.dry_run or not targets:
+        for district, industry, count in targets:
+            print(f"- {app.district_brief_id(district, industry)} {district} × {industry} ({count}곳)")
+        return
+
+    model = app.get_district_brief_model(os.environ.get("GOOGLE_API_KEY") or app.st.secrets["GOOGLE_API_KEY"])
+    started_at = time.perf_counter()
+    failed = []
+    for i, (district, industry, count) in enumerate(targets, start=1):
+        try:
+            record, _ = app.generate_district_brief(model, district, industry, data)
+        except Exception as e:
+            record = None
+            print(f"  오류: {district} × {industry}: {e}")
+        if record is None:
+            failed.append((district, industry))
+        elif not app.save_district_brief(record):
+            print(f"  저장 실패: {district} × {industry} → {app.DISTRICT_BRIEF_DIR}")
+            failed.append((district, industry))
+        if i % 20 == 0 or i == len(targets):
+            print(f"[{i}/{len(targets)}] {time.perf_counter() - started_at:.1f}초")
+
+    print(f"완료: 브리프 {len(targets) - len(failed)}개 갱신, 실패 {len(failed)}개 → {app.DISTRICT_BRIEF_DIR}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()